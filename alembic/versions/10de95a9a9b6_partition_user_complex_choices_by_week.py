@@ -0,0 +1,93 @@
+"""partition user_complex_choices by week_start
+
+Revision ID: 10de95a9a9b6
+Revises: 89e8b2e7f88d
+Create Date: 2026-10-18 10:12:03.418220
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10de95a9a9b6'
+down_revision: Union[str, None] = '89e8b2e7f88d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    # старая таблица уходит в сторону, имя PK-индекса тоже освобождаем
+    op.rename_table('user_complex_choices', 'user_complex_choices_old')
+    op.execute('ALTER INDEX user_complex_choices_pkey RENAME TO user_complex_choices_old_pkey')
+
+    op.create_table(
+        'user_complex_choices',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('weekday_id', sa.Integer(), nullable=False),
+        sa.Column('complex_id', sa.Integer(), nullable=False),
+        sa.Column('week_start', sa.Date(), nullable=False, server_default=sa.text('CURRENT_DATE')),
+        sa.ForeignKeyConstraint(['complex_id'], ['complexes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['weekday_id'], ['weekdays.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('week_start', 'user_id', 'weekday_id'),
+        postgresql_partition_by='RANGE (week_start)',
+    )
+
+    # помесячные партиции: от самой ранней недели в данных до трёх месяцев вперёд
+    first = conn.execute(sa.text('SELECT min(week_start) FROM user_complex_choices_old')).scalar()
+    month = _month_start(first or date.today())
+    last = _month_start(date.today())
+    for _ in range(3):
+        last = _add_month(last)
+    while month <= last:
+        nxt = _add_month(month)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS user_complex_choices_y{month:%Y}m{month:%m} "
+            f"PARTITION OF user_complex_choices FOR VALUES FROM ('{month.isoformat()}') TO ('{nxt.isoformat()}')"
+        )
+        month = nxt
+
+    op.execute(
+        'INSERT INTO user_complex_choices (user_id, weekday_id, complex_id, week_start) '
+        'SELECT user_id, weekday_id, complex_id, week_start FROM user_complex_choices_old'
+    )
+    op.drop_table('user_complex_choices_old')
+
+
+def downgrade() -> None:
+    op.rename_table('user_complex_choices', 'user_complex_choices_part')
+    op.execute('ALTER INDEX user_complex_choices_pkey RENAME TO user_complex_choices_part_pkey')
+
+    op.create_table(
+        'user_complex_choices',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('weekday_id', sa.Integer(), nullable=False),
+        sa.Column('complex_id', sa.Integer(), nullable=False),
+        sa.Column('week_start', sa.Date(), nullable=False, server_default=sa.text('CURRENT_DATE')),
+        sa.ForeignKeyConstraint(['complex_id'], ['complexes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['weekday_id'], ['weekdays.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'weekday_id'),
+    )
+    # старый ключ хранит только одну неделю на (user, weekday) — оставляем последнюю
+    op.execute(
+        'INSERT INTO user_complex_choices (user_id, weekday_id, complex_id, week_start) '
+        'SELECT DISTINCT ON (user_id, weekday_id) user_id, weekday_id, complex_id, week_start '
+        'FROM user_complex_choices_part ORDER BY user_id, weekday_id, week_start DESC'
+    )
+    # партиции удаляются вместе с родительской таблицей
+    op.drop_table('user_complex_choices_part')
@@ -0,0 +1,49 @@
+"""add choice_weeks and choice_snapshots
+
+Revision ID: 5aa1a9ece606
+Revises: cad14caaeaea
+Create Date: 2026-10-18 12:26:15.660391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5aa1a9ece606'
+down_revision: Union[str, None] = 'cad14caaeaea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'choice_weeks',
+        sa.Column('week_start', sa.Date(), nullable=False),
+        sa.Column('cutoff_at', sa.DateTime(), nullable=True),
+        sa.Column('frozen_at', sa.DateTime(), nullable=True),
+        sa.Column('fallback', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.PrimaryKeyConstraint('week_start'),
+    )
+    op.create_table(
+        'choice_snapshots',
+        sa.Column('week_start', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('class_title', sa.String(length=255), nullable=False),
+        sa.Column('lastname', sa.String(length=255), nullable=True),
+        sa.Column('name', sa.String(length=255), nullable=True),
+        sa.Column('patronymic', sa.String(length=255), nullable=False),
+        sa.Column('items', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.PrimaryKeyConstraint('week_start', 'user_id'),
+    )
+    op.create_index('idx_choice_snapshots_week_class', 'choice_snapshots', ['week_start', 'class_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_choice_snapshots_week_class', table_name='choice_snapshots')
+    op.drop_table('choice_snapshots')
+    op.drop_table('choice_weeks')
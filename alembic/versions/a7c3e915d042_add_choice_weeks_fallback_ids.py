@@ -0,0 +1,28 @@
+"""add choice_weeks fallback_ids
+
+Revision ID: a7c3e915d042
+Revises: e41c7b9d2f56
+Create Date: 2026-10-18 21:12:40.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e915d042'
+down_revision: Union[str, None] = 'e41c7b9d2f56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # у уже замороженных недель остаётся NULL: их отчёты считают комплекс по умолчанию по текущему меню
+    op.add_column('choice_weeks', sa.Column('fallback_ids', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('choice_weeks', 'fallback_ids')
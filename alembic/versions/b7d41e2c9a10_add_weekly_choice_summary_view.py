@@ -0,0 +1,39 @@
+"""add weekly_choice_summary materialized view
+
+Revision ID: b7d41e2c9a10
+Revises: 5aa1a9ece606
+Create Date: 2026-10-18 15:02:41.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41e2c9a10'
+down_revision: Union[str, None] = '5aa1a9ece606'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW weekly_choice_summary AS
+        SELECT c.week_start, u.class_id, c.weekday_id, c.complex_id, count(*)::integer AS choices
+        FROM user_complex_choices c
+        JOIN users u ON u.id = c.user_id
+        GROUP BY c.week_start, u.class_id, c.weekday_id, c.complex_id
+        WITH DATA
+        """
+    )
+    # REFRESH ... CONCURRENTLY needs a unique index over all rows
+    op.execute(
+        "CREATE UNIQUE INDEX uq_weekly_choice_summary "
+        "ON weekly_choice_summary (week_start, class_id, weekday_id, complex_id)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS weekly_choice_summary")
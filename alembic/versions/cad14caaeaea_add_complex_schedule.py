@@ -0,0 +1,36 @@
+"""add complex_schedule
+
+Revision ID: cad14caaeaea
+Revises: 10de95a9a9b6
+Create Date: 2026-10-18 11:02:47.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cad14caaeaea'
+down_revision: Union[str, None] = '10de95a9a9b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'complex_schedule',
+        sa.Column('week_start', sa.Date(), nullable=False),
+        sa.Column('weekday_id', sa.Integer(), nullable=False),
+        sa.Column('complex_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['complex_id'], ['complexes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['weekday_id'], ['weekdays.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('week_start', 'weekday_id', 'complex_id'),
+    )
+    op.create_index('idx_complex_schedule_complex_id', 'complex_schedule', ['complex_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_complex_schedule_complex_id', table_name='complex_schedule')
+    op.drop_table('complex_schedule')
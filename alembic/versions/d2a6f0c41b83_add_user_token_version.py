@@ -0,0 +1,26 @@
+"""add user token_version
+
+Revision ID: d2a6f0c41b83
+Revises: b7d41e2c9a10
+Create Date: 2026-10-18 17:41:09.524318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6f0c41b83'
+down_revision: Union[str, None] = 'b7d41e2c9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
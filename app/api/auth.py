@@ -1,28 +1,50 @@
+from concurrent.futures.process import BrokenProcessPool
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.api.deps import db_session, require_admin, get_current_user
-from app.core.security import create_access_token, hash_password, verify_password
+from app.api.deps import Principal, async_db_session, get_current_principal, require_admin, token_claims
+from app.core.db import AsyncDb
+from app.core.security import create_access_token
 from app.models.users import User
 from fastapi.security import OAuth2PasswordRequestForm
-from app.schemas.auth import LoginIn, RegisterIn, TokenOut, ChangePasswordIn
+from app.schemas.auth import LoginIn, RegisterIn, TokenOut, ChangePasswordIn, RefreshIn
 from app.schemas.users import UserOut
+from app.services.cache import principal_cache, reports_cache
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
+from app.services.refresh_tokens import (
+    RefreshTokenError,
+    issue_refresh_token,
+    revoke_refresh_token,
+    revoke_sessions,
+    rotate_refresh_token,
+    session_denylist,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post(
-    "/register",
-    response_model=TokenOut,
-    description="Регистрация пользователя (только админ). Создаёт аккаунт и возвращает JWT-токен. Пароль хешируется.",
-    dependencies=[Depends(require_admin)],
-)
-def register(payload: RegisterIn, db: Session = Depends(db_session)):
-    exists = db.execute(select(User).where((User.login == payload.login))).scalar_one_or_none()
-    if exists:
-        raise HTTPException(status_code=400, detail="Login already registered")
+async def _in_hasher(call, *args):
+    # пароли считаются в пуле процессов, запросы к БД — через AsyncDb, цикл событий свободен
+    try:
+        return await call(*args)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Password hashing is busy, retry later", headers={"Retry-After": "1"})
+    except BrokenProcessPool:
+        # вызов попал в пул, чей воркер умер; следующий submit поднимет новый пул
+        raise HTTPException(status_code=503, detail="Password hashing restarted, retry later", headers={"Retry-After": "1"})
+
+
+# хелперы, после которых ждём pbkdf2, завершают транзакцию: соединение не должно простаивать в ней,
+# пока запрос стоит в очереди хеширования (её глубина больше пула соединений)
+def _login_exists(db: Session, login: str) -> bool:
+    exists = db.execute(select(User.id).where(User.login == login)).first() is not None
+    db.rollback()
+    return exists
+
 
+def _create_user(db: Session, payload: RegisterIn, password_hash: str) -> str:
     user = User(
         login=payload.login,
         name=payload.name,
@@ -36,25 +58,125 @@ def register(payload: RegisterIn, db: Session = Depends(db_session)):
         user_rate=payload.user_rate,
         role_id=payload.role_id,
         is_complex=payload.is_complex,
-        password_hash=hash_password(payload.password),
+        password_hash=password_hash,
     )
     db.add(user)
     db.commit()
-    token = create_access_token(str(user.id))
+    reports_cache.bump()
+    return create_access_token(str(user.id), claims=token_claims(user))
+
+
+def _find_login(db: Session, login: str) -> tuple[int, str | None] | None:
+    row = db.execute(select(User.id, User.password_hash).where(User.login == login)).one_or_none()
+    db.rollback()
+    return tuple(row) if row else None
+
+
+def _start_session(db: Session, user: User) -> TokenOut:
+    refresh_token, row = issue_refresh_token(db, user.id)
+    claims = token_claims(user, row.family_id)
+    db.commit()
+    return TokenOut(access_token=create_access_token(str(user.id), claims=claims), refresh_token=refresh_token)
+
+
+def _password_hash(db: Session, user_id: int) -> str | None:
+    password_hash = db.scalar(select(User.password_hash).where(User.id == user_id))
+    db.rollback()
+    return password_hash
+
+
+def _start_login_session(db: Session, user_id: int) -> TokenOut:
+    return _start_session(db, db.get(User, user_id))
+
+
+def _save_password(db: Session, user_id: int, password_hash: str) -> TokenOut:
+    user = db.get(User, user_id)
+    user.password_hash = password_hash
+    user.token_version += 1
+    db.add(user)
+    # все остальные сессии пользователя закрываются, текущему клиенту выдаётся новая
+    revoked = revoke_sessions(db, user_id=user.id)
+    tokens = _start_session(db, user)
+    principal_cache.invalidate(user.id)
+    for family_id in revoked:
+        session_denylist.add(family_id)
+    return tokens
+
+
+def _refresh_session(db: Session, token: str) -> TokenOut:
+    try:
+        refresh_token, row = rotate_refresh_token(db, token)
+    except RefreshTokenError:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user = db.get(User, row.user_id)
+    claims = token_claims(user, row.family_id)
+    return TokenOut(access_token=create_access_token(str(user.id), claims=claims), refresh_token=refresh_token)
+
+
+def _logout(db: Session, token: str) -> list[str]:
+    revoked = revoke_refresh_token(db, token)
+    db.commit()
+    return revoked
+
+
+def _profile(db: Session, user_id: int) -> UserOut:
+    user = db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+    # класс подгружается здесь же, пока сессия открыта
+    return UserOut.model_validate(user)
+
+
+@router.post(
+    "/register",
+    response_model=TokenOut,
+    description="Регистрация пользователя (только админ). Создаёт аккаунт и возвращает JWT-токен. Пароль хешируется.",
+    dependencies=[Depends(require_admin)],
+)
+async def register(payload: RegisterIn, db: AsyncDb = Depends(async_db_session)):
+    if await db.run(_login_exists, payload.login):
+        raise HTTPException(status_code=400, detail="Login already registered")
+    password_hash = await _in_hasher(password_hasher.hash, payload.password)
+    token = await db.run(_create_user, payload, password_hash)
     return TokenOut(access_token=token)
 
 
 @router.post(
     "/login",
     response_model=TokenOut,
-    description="Аутентификация по логину/паролю. Возвращает JWT-токен Bearer. Поддерживает OAuth2PasswordRequestForm.",
+    description=(
+        "Аутентификация по логину/паролю. Возвращает короткоживущий JWT-токен Bearer и refresh-токен "
+        "для /auth/refresh. Поддерживает OAuth2PasswordRequestForm."
+    ),
 )
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(db_session)):
-    user = db.execute(select(User).where(User.login == form.username)).scalar_one_or_none()
-    if not user or not user.password_hash or not verify_password(form.password, user.password_hash):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncDb = Depends(async_db_session)):
+    found = await db.run(_find_login, form.username)
+    if not found or not found[1] or not await _in_hasher(password_hasher.verify, form.password, found[1]):
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    token = create_access_token(str(user.id))
-    return TokenOut(access_token=token)
+    return await db.run(_start_login_session, found[0])
+
+
+@router.post(
+    "/refresh",
+    response_model=TokenOut,
+    description=(
+        "Обменять refresh-токен на новую пару access/refresh. Каждый refresh-токен одноразовый: "
+        "повторное предъявление отзывает всю сессию."
+    ),
+)
+async def refresh(payload: RefreshIn, db: AsyncDb = Depends(async_db_session)):
+    return await db.run(_refresh_session, payload.refresh_token)
+
+
+@router.post(
+    "/logout",
+    description="Завершить сессию refresh-токена: он и выданные по нему access-токены перестают действовать.",
+)
+async def logout(payload: RefreshIn, db: AsyncDb = Depends(async_db_session)):
+    revoked = await db.run(_logout, payload.refresh_token)
+    for family_id in revoked:
+        session_denylist.add(family_id)
+    return {"status": "logged_out"}
 
 
 @router.get(
@@ -62,20 +184,43 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(db_
     response_model=UserOut,
     description="Вернуть профиль текущего авторизованного пользователя."
 )
-def me(current = Depends(get_current_user)):
-    return current
+async def me(principal: Principal = Depends(get_current_principal), db: AsyncDb = Depends(async_db_session)):
+    return await db.run(_profile, principal.id)
 
 
 @router.post(
     "/change-password",
-    description="Смена пароля текущего пользователя. Требует указать текущий и новый пароли."
+    description=(
+        "Смена пароля текущего пользователя. Требует указать текущий и новый пароли. "
+        "Ранее выданные токены и сессии перестают действовать, в ответе — новая пара токенов."
+    ),
+    response_model=TokenOut,
 )
-def change_password(payload: ChangePasswordIn, current = Depends(get_current_user), db: Session = Depends(db_session)):
-    if not current.password_hash or not verify_password(payload.current_password, current.password_hash):
+async def change_password(
+    payload: ChangePasswordIn,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncDb = Depends(async_db_session),
+):
+    current_hash = await db.run(_password_hash, principal.id)
+    if not current_hash or not await _in_hasher(password_hasher.verify, payload.current_password, current_hash):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
-    current.password_hash = hash_password(payload.new_password)
-    db.add(current)
-    db.commit()
-    return {"status": "changed"}
+    password_hash = await _in_hasher(password_hasher.hash, payload.new_password)
+    return await db.run(_save_password, principal.id, password_hash)
 
 
+@router.get(
+    "/hasher",
+    dependencies=[Depends(require_admin)],
+    description="Статистика пула хеширования паролей (только админ): процессы, глубина очереди, задержка, отказы."
+)
+def get_hasher_stats():
+    return password_hasher.stats()
+
+
+@router.get(
+    "/sessions/denylist",
+    dependencies=[Depends(require_admin)],
+    description="Статистика списка отозванных сессий в памяти процесса (только админ)."
+)
+def get_session_denylist_stats():
+    return session_denylist.stats()
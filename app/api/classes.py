@@ -1,3 +1,5 @@
+from datetime import date
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
@@ -5,6 +7,12 @@ from sqlalchemy.orm import Session
 from app.api.deps import db_session, require_admin
 from app.models.users import Class as ClassModel, User
 from app.schemas.classes import ClassCreate, ClassOut, ClassUpdate, ClassAddStudentsIn
+from app.schemas.complexes import ChoiceItem, ClassChoicesSetIn
+from app.services.cache import reports_cache
+from app.services.choices import find_invalid_choices, upsert_choices
+from app.services.freeze import WeekLockedError, is_week_locked, lock_week_for_write
+from app.services.summary import choices_changed
+from app.services.weeks import next_monday, week_monday
 
 
 router = APIRouter(prefix="/classes", tags=["classes"])
@@ -59,6 +67,7 @@ def update_class(class_id: int, payload: ClassUpdate, db: Session = Depends(db_s
         setattr(obj, k, v)
     db.add(obj)
     db.commit()
+    reports_cache.bump()
     db.refresh(obj)
     return obj
 
@@ -74,6 +83,7 @@ def delete_class(class_id: int, db: Session = Depends(db_session)):
         raise HTTPException(status_code=404, detail="Class not found")
     db.delete(obj)
     db.commit()
+    reports_cache.bump()
     return {"status": "deleted"}
 
 
@@ -91,6 +101,7 @@ def add_students(class_id: int, payload: ClassAddStudentsIn, db: Session = Depen
         u.class_id = class_id
         db.add(u)
     db.commit()
+    choices_changed()
     return {"status": "added", "count": len(users)}
 
 
@@ -122,6 +133,50 @@ def remove_student(
     user.class_id = to_class_id
     db.add(user)
     db.commit()
+    choices_changed()
     return {"status": "moved", "user_id": user_id, "from": class_id, "to": to_class_id}
 
 
+@router.post(
+    "/{class_id}/choices",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Проставить выбор комплексов за весь класс одним запросом (только админ). "
+        "everyone — один комплекс на день для всех учеников, users — выбор по ученикам (важнее everyone). "
+        "Переданные дни перезаписываются, остальные не трогаются. Неделя по умолчанию — следующая."
+    )
+)
+def set_class_choices(class_id: int, payload: ClassChoicesSetIn, db: Session = Depends(db_session)):
+    obj = db.get(ClassModel, class_id)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Class not found")
+    week_start = week_monday(payload.week_start) if payload.week_start else next_monday(date.today())
+    if is_week_locked(db, week_start):
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+
+    class_user_ids = set(db.scalars(select(User.id).where(User.class_id == class_id)).all())
+    foreign = sorted({u.user_id for u in payload.users} - class_user_ids)
+    if foreign:
+        raise HTTPException(status_code=400, detail=f"Users not in this class: {foreign}")
+
+    cells: dict[tuple[int, int], int] = {}
+    for item in payload.everyone:
+        for user_id in class_user_ids:
+            cells[(user_id, item.weekday_id)] = item.complex_id
+    for user_choices in payload.users:
+        for item in user_choices.items:
+            cells[(user_choices.user_id, item.weekday_id)] = item.complex_id
+
+    pairs = {(weekday_id, complex_id) for (_, weekday_id), complex_id in cells.items()}
+    if find_invalid_choices(db, week_start, [ChoiceItem(weekday_id=w, complex_id=c) for w, c in pairs]):
+        raise HTTPException(status_code=400, detail="Invalid weekday or complex")
+
+    try:
+        # повторная проверка в транзакции записи: неделю могли заморозить после проверки выше
+        lock_week_for_write(db, week_start)
+    except WeekLockedError:
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+    count = upsert_choices(db, week_start, [(u, w, c) for (u, w), c in cells.items()])
+    db.commit()
+    choices_changed()
+    return {"status": "saved", "week_start": str(week_start), "count": count}
@@ -1,14 +1,36 @@
+import asyncio
+import logging
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import select, delete
-from datetime import date, timedelta
+from datetime import date, datetime
 
-from app.api.deps import db_session, get_current_user, require_admin
-from app.models.complexes import Complex, ComplexProduct, ComplexWeekday, Weekday, UserComplexChoice
-from app.models.products import Product
+from app.api.deps import Principal, async_db_session, db_session, get_current_principal, require_admin
+from app.core.config import settings
+from app.core.db import AsyncDb
+from app.api.http_cache import MENU_CACHE_CONTROL, cached_json_response_async
+from app.models.complexes import Complex, ComplexProduct, ComplexSchedule, ComplexWeekday
 from app.schemas.complexes import ComplexCreate, ComplexOut, ComplexUpdate, ChoicesSetIn
-from app.models.users import User
+from app.models.snapshots import ChoiceWeek
+from app.services.cache import menu_cache, weekdays_cache, product_types_cache, products_cache, reports_cache, principal_cache
+from app.services.choice_writer import choice_writer
+from app.services.choices import copy_choices, find_invalid_choices, save_user_choices
+from app.services.freeze import (
+    WeekLockedError,
+    default_cutoff,
+    freeze_week,
+    is_week_frozen,
+    is_week_locked,
+    load_frozen_choices,
+)
+from app.services.partitions import list_choice_partitions, detach_choice_partitions, latest_detach_bound
+from app.services.summary import choices_changed
+from app.services.weeks import current_monday, next_monday, week_monday
+from app.services.menu import encode_week_menu, ensure_week_schedule, load_user_choices, load_week_menu
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/complexes", tags=["complexes"])
 
@@ -17,7 +39,7 @@ router = APIRouter(prefix="/complexes", tags=["complexes"])
     "/",
     response_model=ComplexOut,
     dependencies=[Depends(require_admin)],
-    description="Создать комплекс (только админ). Можно указать продукты и дни недели."
+    description="Создать комплекс (только админ). Можно указать продукты и дни недели. С week_start комплекс попадает только в меню этой недели; неделя с собственным расписанием перестаёт следовать постоянному меню."
 )
 def create_complex(payload: ComplexCreate, db: Session = Depends(db_session)):
     complex_obj = Complex(
@@ -30,10 +52,19 @@ def create_complex(payload: ComplexCreate, db: Session = Depends(db_session)):
 
     for pid in payload.product_ids:
         db.add(ComplexProduct(complex_id=complex_obj.id, product_id=pid))
-    for wid in payload.weekday_ids:
-        db.add(ComplexWeekday(complex_id=complex_obj.id, weekday_id=wid))
+    if payload.week_start:
+        # комплекс на конкретную неделю, а не на каждую
+        week_start = week_monday(payload.week_start)
+        ensure_week_schedule(db, week_start)
+        for wid in payload.weekday_ids:
+            db.add(ComplexSchedule(week_start=week_start, weekday_id=wid, complex_id=complex_obj.id))
+    else:
+        for wid in payload.weekday_ids:
+            db.add(ComplexWeekday(complex_id=complex_obj.id, weekday_id=wid))
 
     db.commit()
+    menu_cache.bump()
+    reports_cache.bump()
     db.refresh(complex_obj)
     return complex_obj
 
@@ -44,7 +75,7 @@ def create_complex(payload: ComplexCreate, db: Session = Depends(db_session)):
     description="Получить все комплексы."
 )
 def get_complexes(db: Session = Depends(db_session)):
-    return db.execute(select(Complex)).scalars().all()
+    return db.execute(select(Complex).options(selectinload(Complex.products))).scalars().all()
 
 @router.get(
     "/{complex_id}",
@@ -62,7 +93,7 @@ def get_complex(complex_id: int, db: Session = Depends(db_session)):
     "/{complex_id}",
     response_model=ComplexOut,
     dependencies=[Depends(require_admin)],
-    description="Обновить комплекс (только админ). Обновляет связи с продуктами и днями."
+    description="Обновить комплекс (только админ). Обновляет связи с продуктами и днями. С week_start дни меняются только в расписании этой недели (weekday_ids обязательны, [] убирает комплекс из недели)."
 )
 def update_complex(complex_id: int, payload: ComplexUpdate, db: Session = Depends(db_session)):
     obj = db.get(Complex, complex_id)
@@ -72,6 +103,9 @@ def update_complex(complex_id: int, payload: ComplexUpdate, db: Session = Depend
     data = payload.model_dump(exclude_unset=True)
     product_ids = data.pop("product_ids", None)
     weekday_ids = data.pop("weekday_ids", None)
+    week_start = data.pop("week_start", None)
+    if week_start and weekday_ids is None:
+        raise HTTPException(status_code=400, detail="week_start requires weekday_ids")
 
     for k, v in data.items():
         setattr(obj, k, v)
@@ -83,12 +117,25 @@ def update_complex(complex_id: int, payload: ComplexUpdate, db: Session = Depend
         for pid in product_ids:
             db.add(ComplexProduct(complex_id=obj.id, product_id=pid))
 
-    if weekday_ids is not None:
+    if weekday_ids is not None and week_start:
+        week_start = week_monday(week_start)
+        ensure_week_schedule(db, week_start)
+        db.execute(
+            delete(ComplexSchedule).where(
+                ComplexSchedule.complex_id == obj.id,
+                ComplexSchedule.week_start == week_start,
+            )
+        )
+        for wid in weekday_ids:
+            db.add(ComplexSchedule(week_start=week_start, weekday_id=wid, complex_id=obj.id))
+    elif weekday_ids is not None:
         db.execute(delete(ComplexWeekday).where(ComplexWeekday.complex_id == obj.id))
         for wid in weekday_ids:
             db.add(ComplexWeekday(complex_id=obj.id, weekday_id=wid))
 
     db.commit()
+    menu_cache.bump()
+    reports_cache.bump()
     db.refresh(obj)
     return obj
 
@@ -104,171 +151,255 @@ def delete_complex(complex_id: int, db: Session = Depends(db_session)):
         raise HTTPException(status_code=404, detail="Complex not found")
     db.delete(obj)
     db.commit()
+    menu_cache.bump()
+    choices_changed()
     return {"status": "deleted"}
 
 
-def _next_monday(today: date) -> date:
-    return today + timedelta(days=((7 - today.weekday()) % 7))
-
-def _current_monday(today: date) -> date:
-    return today - timedelta(days=today.weekday())
-
-
 @router.get(
     "/week/next",
     description="Получить комплексы на следующую неделю, сгруппированные по weekday_id (1..7)."
 )
-def get_next_week_complexes(db: Session = Depends(db_session), user: User = Depends(get_current_user)):
-    rows = db.execute(
-        select(ComplexWeekday.weekday_id, Complex)
-        .join(Complex, Complex.id == ComplexWeekday.complex_id)
-        .where(Complex.is_closed == False)
-    ).all()
-    result: dict[int, list[ComplexOut]] = {}
-    for weekday_id, complex_obj in rows:
-        # Получаем продукты для комплекса
-        products = db.execute(
-            select(Product)
-            .join(ComplexProduct, ComplexProduct.product_id == Product.id)
-            .where(ComplexProduct.complex_id == complex_obj.id)
-        ).scalars().all()
-        
-        # Создаем ComplexOut с продуктами
-        complex_out = ComplexOut.model_validate(complex_obj)
-        complex_out.products = products
-        
-        result.setdefault(weekday_id, []).append(complex_out)
-    return result
+async def get_next_week_complexes(request: Request, db: AsyncDb = Depends(async_db_session), user: Principal = Depends(get_current_principal)):
+    week_start = next_monday(date.today())
+    return await cached_json_response_async(
+        request, menu_cache, week_start, lambda: db.run_encoded(load_week_menu, encode_week_menu, week_start), MENU_CACHE_CONTROL
+    )
 
 
 @router.get(
     "/week/current",
     description="Получить комплексы на текущую неделю, сгруппированные по weekday_id (1..7)."
 )
-def get_current_week_complexes(db: Session = Depends(db_session), user: User = Depends(get_current_user)):
-    rows = db.execute(
-        select(ComplexWeekday.weekday_id, Complex)
-        .join(Complex, Complex.id == ComplexWeekday.complex_id)
-        .where(Complex.is_closed == False)
-    ).all()
-    result: dict[int, list[ComplexOut]] = {}
-    for weekday_id, complex_obj in rows:
-        # Получаем продукты для комплекса
-        products = db.execute(
-            select(Product)
-            .join(ComplexProduct, ComplexProduct.product_id == Product.id)
-            .where(ComplexProduct.complex_id == complex_obj.id)
-        ).scalars().all()
-        
-        # Создаем ComplexOut с продуктами
-        complex_out = ComplexOut.model_validate(complex_obj)
-        complex_out.products = products
-        
-        result.setdefault(weekday_id, []).append(complex_out)
-    return result
+async def get_current_week_complexes(request: Request, db: AsyncDb = Depends(async_db_session), user: Principal = Depends(get_current_principal)):
+    week_start = current_monday(date.today())
+    return await cached_json_response_async(
+        request, menu_cache, week_start, lambda: db.run_encoded(load_week_menu, encode_week_menu, week_start), MENU_CACHE_CONTROL
+    )
+
+
+@router.get(
+    "/week/cache",
+    dependencies=[Depends(require_admin)],
+    description="Статистика кэшей меню, справочников и принципалов (только админ): версия, попадания, промахи, пересборки."
+)
+def get_menu_cache_stats():
+    caches = (menu_cache, weekdays_cache, product_types_cache, products_cache, reports_cache, principal_cache)
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def _check_choices(db: Session, week_start: date, items: list) -> None:
+    if is_week_locked(db, week_start):
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+    weekday_ids = [item.weekday_id for item in items]
+    if len(set(weekday_ids)) != len(weekday_ids):
+        raise HTTPException(status_code=400, detail="Duplicate weekday in choices")
+    if find_invalid_choices(db, week_start, items):
+        raise HTTPException(status_code=400, detail="Invalid weekday or complex")
+    if settings.choices_group_commit:
+        # отдаём соединение в пул до ожидания группового коммита
+        db.rollback()
+
+
+def _save_choices(db: Session, user_id: int, week_start: date, items: list) -> None:
+    try:
+        save_user_choices(db, user_id, week_start, items)
+    except WeekLockedError:
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+    db.commit()
 
 
 @router.post(
     "/week/next/choices",
-    description="Выбрать комплексы по дням следующей недели (перезаписывает выбор)."
+    description=(
+        "Выбрать комплексы по дням следующей недели (перезаписывает выбор). "
+        "Если групповой коммит не успел за CHOICES_COMMIT_TIMEOUT_S, ответ 202 со status=pending: выбор принят в очередь, результат виден в GET /complexes/week/next/choices."
+    )
 )
-def set_next_week_choices(payload: ChoicesSetIn, db: Session = Depends(db_session), user: User = Depends(get_current_user)):
-    week_start = _next_monday(date.today())
-    db.execute(
-        delete(UserComplexChoice).where(
-            UserComplexChoice.user_id == user.id,
-            UserComplexChoice.week_start == week_start,
-        )
+async def set_next_week_choices(payload: ChoicesSetIn, db: AsyncDb = Depends(async_db_session), user: Principal = Depends(get_current_principal)):
+    week_start = next_monday(date.today())
+    await db.run(_check_choices, week_start, payload.items)
+    if settings.choices_group_commit:
+        future = choice_writer.submit(user.id, week_start, payload.items)
+        try:
+            # shield: по таймауту перестаём ждать, но не отменяем запись в очереди
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), settings.choices_commit_timeout_s)
+        except WeekLockedError:
+            raise HTTPException(status_code=409, detail="Choices for this week are locked")
+        except TimeoutError:
+            # запись остаётся в очереди и, скорее всего, ещё закоммитится: не говорим, что она не удалась
+            return JSONResponse(status_code=202, content={"status": "pending", "week_start": str(week_start)})
+        except Exception:
+            # писатель уже откатил пачку и повторил запись по одной: эта запись точно не сохранена
+            logger.exception("group commit of choices for user %s failed", user.id)
+            raise HTTPException(status_code=409, detail="Choices were not saved")
+    else:
+        await db.run(_save_choices, user.id, week_start, payload.items)
+        choices_changed()
+    return {"status": "saved", "week_start": str(week_start)}
+
+
+def _copy_own_choices(db: Session, user_id: int, source: date, week_start: date) -> int:
+    if is_week_locked(db, week_start):
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+    try:
+        count = copy_choices(db, source, week_start, user_id=user_id)
+    except WeekLockedError:
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+    db.commit()
+    return count
+
+
+@router.post(
+    "/week/next/choices/copy",
+    description=(
+        "Скопировать свой выбор с другой недели (по умолчанию — с текущей) на следующую. "
+        "Закрытые и не предлагаемые в этот день комплексы пропускаются, уже сделанный выбор не перезаписывается."
     )
-    for item in payload.items:
-        if not db.get(Weekday, item.weekday_id) or not db.get(Complex, item.complex_id):
-            raise HTTPException(status_code=400, detail="Invalid weekday or complex")
-        db.add(
-            UserComplexChoice(
-                user_id=user.id,
-                weekday_id=item.weekday_id,
-                complex_id=item.complex_id,
-                week_start=week_start,
-            )
-        )
+)
+async def copy_to_next_week_choices(
+    from_week_start: date | None = None,
+    db: AsyncDb = Depends(async_db_session),
+    user: Principal = Depends(get_current_principal),
+):
+    week_start = next_monday(date.today())
+    source = week_monday(from_week_start or date.today())
+    if source == week_start:
+        raise HTTPException(status_code=400, detail="Source and target weeks are the same")
+    count = await db.run(_copy_own_choices, user.id, source, week_start)
+    choices_changed()
+    return {"status": "copied", "week_start": str(week_start), "count": count}
+
+
+@router.post(
+    "/choices/copy",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Скопировать выбор всех учеников (или одного класса через class_id) с недели from_week_start "
+        "на неделю to_week_start одним запросом (только админ). По умолчанию — с текущей на следующую."
+    )
+)
+def copy_choices_bulk(
+    from_week_start: date | None = None,
+    to_week_start: date | None = None,
+    class_id: int | None = None,
+    db: Session = Depends(db_session),
+):
+    source = week_monday(from_week_start or date.today())
+    target = week_monday(to_week_start) if to_week_start else next_monday(date.today())
+    if source == target:
+        raise HTTPException(status_code=400, detail="Source and target weeks are the same")
+    if is_week_locked(db, target):
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
+    try:
+        count = copy_choices(db, source, target, class_id=class_id)
+    except WeekLockedError:
+        raise HTTPException(status_code=409, detail="Choices for this week are locked")
     db.commit()
-    return {"status": "saved", "week_start": str(week_start)}
+    choices_changed()
+    return {"status": "copied", "from_week_start": str(source), "week_start": str(target), "count": count}
+
+
+@router.get(
+    "/choices/weeks/{week_start}",
+    dependencies=[Depends(require_admin)],
+    description="Дедлайн и статус заморозки выбора на неделю (только админ)."
+)
+def get_choice_week(week_start: date, db: Session = Depends(db_session)):
+    week_start = week_monday(week_start)
+    week = db.get(ChoiceWeek, week_start)
+    cutoff_at = week.cutoff_at if week is not None and week.cutoff_at else default_cutoff(week_start)
+    return {
+        "week_start": str(week_start),
+        "cutoff_at": cutoff_at,
+        "frozen_at": week.frozen_at if week is not None else None,
+        "locked": is_week_locked(db, week_start),
+    }
+
+
+@router.put(
+    "/choices/weeks/{week_start}/cutoff",
+    dependencies=[Depends(require_admin)],
+    description="Задать дедлайн выбора на неделю (только админ). Для замороженной недели вернёт 409."
+)
+def set_choice_week_cutoff(week_start: date, cutoff_at: datetime, db: Session = Depends(db_session)):
+    week_start = week_monday(week_start)
+    if is_week_frozen(db, week_start):
+        raise HTTPException(status_code=409, detail="Week is already frozen")
+    week = db.get(ChoiceWeek, week_start) or ChoiceWeek(week_start=week_start)
+    week.cutoff_at = cutoff_at
+    db.add(week)
+    db.commit()
+    return {"week_start": str(week_start), "cutoff_at": cutoff_at}
+
+
+@router.post(
+    "/choices/weeks/{week_start}/freeze",
+    dependencies=[Depends(require_admin)],
+    description="Заморозить выбор недели немедленно, не дожидаясь дедлайна (только админ)."
+)
+def freeze_choice_week(week_start: date, db: Session = Depends(db_session)):
+    week_start = week_monday(week_start)
+    if not freeze_week(db, week_start):
+        raise HTTPException(status_code=409, detail="Week is already frozen")
+    return {"status": "frozen", "week_start": str(week_start)}
+
+
+@router.get(
+    "/week/next/choices/queue",
+    dependencies=[Depends(require_admin)],
+    description="Состояние очереди группового сохранения выборов (только админ)."
+)
+def get_choice_queue_stats():
+    return choice_writer.stats()
+
+
+@router.get(
+    "/choices/partitions",
+    dependencies=[Depends(require_admin)],
+    description="Список помесячных партиций user_complex_choices (только админ)."
+)
+def get_choice_partitions(db: Session = Depends(db_session)):
+    return list_choice_partitions(db.get_bind())
+
+
+@router.post(
+    "/choices/partitions/detach",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Отсоединить партиции выборов, целиком лежащие раньше даты before (только админ). Данные остаются в архивных таблицах. "
+        "before не может быть позже первого числа месяца, в котором начинается текущая неделя."
+    )
+)
+def detach_old_choice_partitions(before: date, db: Session = Depends(db_session)):
+    # живые данные отсоединять нельзя: следующая запись создаст пустую партицию, и выбор пропадёт из меню и выгрузок
+    bound = latest_detach_bound(date.today())
+    if before > bound:
+        raise HTTPException(status_code=400, detail=f"before must not be later than {bound.isoformat()}")
+    return {"detached": detach_choice_partitions(db.get_bind(), before)}
+
+
+def _user_choices(db: Session, user_id: int, week_start: date) -> dict:
+    # после заморозки неделя читается из снимка одной строкой по PK
+    if is_week_frozen(db, week_start):
+        return load_frozen_choices(db, user_id, week_start)
+    return load_user_choices(db, user_id, week_start)
 
 
 @router.get(
     "/week/next/choices",
     description="Получить текущий выбор комплексов пользователя на следующую неделю."
 )
-def get_next_week_choices(db: Session = Depends(db_session), user: User = Depends(get_current_user)):
-    week_start = _next_monday(date.today())
-    choices = db.execute(
-        select(UserComplexChoice.weekday_id, Complex)
-        .join(Complex, Complex.id == UserComplexChoice.complex_id)
-        .where(
-            UserComplexChoice.user_id == user.id,
-            UserComplexChoice.week_start == week_start,
-        )
-    ).all()
-    
-    result = {"week_start": str(week_start), "items": []}
-    
-    for weekday_id, complex_obj in choices:
-        # Получаем продукты для комплекса
-        products = db.execute(
-            select(Product)
-            .join(ComplexProduct, ComplexProduct.product_id == Product.id)
-            .where(ComplexProduct.complex_id == complex_obj.id)
-        ).scalars().all()
-        
-        # Создаем ComplexOut с продуктами
-        complex_out = ComplexOut.model_validate(complex_obj)
-        complex_out.products = products
-        
-        result["items"].append({
-            "weekday_id": weekday_id,
-            "complex_id": complex_obj.id,
-            "complex": complex_out
-        })
-    
-    return result
+async def get_next_week_choices(db: AsyncDb = Depends(async_db_session), user: Principal = Depends(get_current_principal)):
+    return await db.run(_user_choices, user.id, next_monday(date.today()))
 
 
 @router.get(
     "/week/current/choices",
     description="Получить текущий выбор комплексов пользователя на текущую неделю."
 )
-def get_current_week_choices(db: Session = Depends(db_session), user: User = Depends(get_current_user)):
-    week_start = _current_monday(date.today())
-    choices = db.execute(
-        select(UserComplexChoice.weekday_id, Complex)
-        .join(Complex, Complex.id == UserComplexChoice.complex_id)
-        .where(
-            UserComplexChoice.user_id == user.id,
-            UserComplexChoice.week_start == week_start,
-        )
-    ).all()
-    
-    result = {"week_start": str(week_start), "items": []}
-    
-    for weekday_id, complex_obj in choices:
-        # Получаем продукты для комплекса
-        products = db.execute(
-            select(Product)
-            .join(ComplexProduct, ComplexProduct.product_id == Product.id)
-            .where(ComplexProduct.complex_id == complex_obj.id)
-        ).scalars().all()
-        
-        # Создаем ComplexOut с продуктами
-        complex_out = ComplexOut.model_validate(complex_obj)
-        complex_out.products = products
-        
-        result["items"].append({
-            "weekday_id": weekday_id,
-            "complex_id": complex_obj.id,
-            "complex": complex_out
-        })
-    
-    return result
+async def get_current_week_choices(db: AsyncDb = Depends(async_db_session), user: Principal = Depends(get_current_principal)):
+    return await db.run(_user_choices, user.id, current_monday(date.today()))
 
 
 @router.patch(
@@ -283,6 +414,8 @@ def set_complex_closed(complex_id: int, is_closed: bool, db: Session = Depends(d
     obj.is_closed = is_closed
     db.add(obj)
     db.commit()
+    menu_cache.bump()
+    reports_cache.bump()
     db.refresh(obj)
     return {"id": obj.id, "is_closed": obj.is_closed}
 
@@ -1,13 +1,16 @@
-from typing import Generator
+from dataclasses import dataclass
+from typing import AsyncIterator, Generator
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from app.core.db import get_db
+from app.core.db import AsyncDb, get_async_db, get_db
 from app.core.security import decode_token
 from app.models.users import User, UserRole
+from app.services.cache import principal_cache
+from app.services.refresh_tokens import session_denylist
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -17,34 +20,87 @@ def db_session() -> Generator[Session, None, None]:
     yield from get_db()
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(db_session)) -> User:
+async def async_db_session() -> AsyncIterator[AsyncDb]:
+    async for db in get_async_db():
+        yield db
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    role: str
+    token_version: int
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+
+def token_claims(user: User, session_id: str | None = None) -> dict:
+    """Claims for create_access_token: the role name, the user's token version and the session."""
+    claims = {"role": user.role.name, "ver": user.token_version}
+    if session_id is not None:
+        claims["sid"] = session_id
+    return claims
+
+
+def load_principal(db: Session, user_id: int) -> Principal | None:
+    row = db.execute(
+        select(User.id, UserRole.name, User.token_version)
+        .join(UserRole, UserRole.id == User.role_id)
+        .where(User.id == user_id)
+    ).one_or_none()
+    # транзакция не нужна дальше: обработчик может ещё долго ждать (например, хеширования пароля)
+    db.rollback()
+    return Principal(*row) if row else None
+
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication")
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncDb = Depends(async_db_session)) -> Principal:
+    """
+    Who is calling, without touching the database while the user is in principal_cache.
+    The token's "ver" must match the user's token_version, which is bumped on password
+    and role changes; tokens issued before the claims existed count as version 0.
+    Tokens of a revoked session ("sid") are rejected via the in-memory session_denylist.
+    A token newer than the cached version means another process changed the user, so the
+    principal is loaded again before deciding.
+    """
     try:
         payload = decode_token(token)
-        sub = payload.get("sub")
-        if not sub:
-            raise ValueError("no sub")
-        user = db.get(User, int(sub))
+        user_id = int(payload["sub"])
+        version = int(payload.get("ver", 0))
     except Exception:
-        user = None
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication")
-    return user
+        raise _unauthorized()
+    if payload.get("sid") in session_denylist:
+        raise _unauthorized()
+    principal = principal_cache.get(user_id)
+    # версии только растут: токен новее кэша выдан после смены пароля или роли в другом процессе
+    if principal is None or principal.token_version < version:
+        principal = await db.run(load_principal, user_id)
+        if principal is None:
+            principal_cache.invalidate(user_id)
+            raise _unauthorized()
+        principal_cache.put(user_id, principal)
+    if principal.token_version != version:
+        raise _unauthorized()
+    role = payload.get("role")
+    if role is not None and role != principal.role:
+        raise _unauthorized()
+    return principal
 
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role is None:
-        # load role if lazy
-        pass
-    if not current_user.role or current_user.role.name != "admin":
+async def require_admin(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if not principal.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
-    return current_user
+    return principal
 
 
-def require_self_or_admin(user_id: int, current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role and current_user.role.name == "admin":
-        return current_user
-    if current_user.id != user_id:
+async def require_self_or_admin(user_id: int, principal: Principal = Depends(get_current_principal)) -> Principal:
+    if principal.is_admin:
+        return principal
+    if principal.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    return current_user
-
-
+    return principal
@@ -1,32 +1,37 @@
-from io import BytesIO
+import json
+import os
 from datetime import date, timedelta
-from collections import defaultdict
 
-from fastapi import APIRouter, Depends
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.api.deps import db_session, require_admin
-from app.models.users import User, Class
-from app.models.complexes import UserComplexChoice, Complex, ComplexWeekday
+from app.api.deps import async_db_session, require_admin
+from app.api.http_cache import REPORTS_CACHE_CONTROL, cached_json_response_async
+from app.core.config import settings
+from app.core.db import AsyncDb, SessionLocal
+from app.models.complexes import UserComplexChoice
+from app.services.cache import reports_cache
+from app.services.choices_export import (
+    EXPORT_FORMATS,
+    STREAM_FORMATS,
+    XLSX_MEDIA_TYPE,
+    build_cached_export,
+    stream_choices,
+    week_data_version,
+)
+from app.services.export_jobs import export_jobs
+from app.services.range_export import RANGE_LAYOUTS, range_data_version, range_weeks
+from app.services.reports import build_kitchen_workbook, encode_report, kitchen_report, procurement_report
+from app.services.summary import summary_refresher
+from app.services.weeks import current_monday, next_monday
 
 
 router = APIRouter(prefix="/exports", tags=["exports"]) 
 
 
-def _current_monday(today: date) -> date:
-    return today - timedelta(days=today.weekday())
-
-
-def _last_week_monday(today: date) -> date:
-    return _current_monday(today) - timedelta(days=7)
-
-
-def _next_monday(today: date) -> date:
-    return today + timedelta(days=((7 - today.weekday()) % 7))
-
-
 def _resolve_week_start(db: Session, mode: str | None, explicit: date | None) -> date:
     """
     Resolve which week_start to export:
@@ -40,11 +45,11 @@ def _resolve_week_start(db: Session, mode: str | None, explicit: date | None) ->
     if explicit:
         return explicit
     if mode == "last":
-        return _last_week_monday(today)
+        return current_monday(today) - timedelta(days=7)
     if mode == "current":
-        return _current_monday(today)
+        return current_monday(today)
     if mode == "next":
-        return _next_monday(today)
+        return next_monday(today)
 
     # latest by data
     latest = db.execute(
@@ -53,158 +58,225 @@ def _resolve_week_start(db: Session, mode: str | None, explicit: date | None) ->
         .order_by(UserComplexChoice.week_start.desc())
         .limit(1)
     ).scalar_one_or_none()
-    return latest or _last_week_monday(today)
+    return latest or current_monday(today) - timedelta(days=7)
 
 
 @router.get(
     "/choices/last-week.xlsx",
+    dependencies=[Depends(require_admin)],
     description=(
-        "Экспорт выборов комплексов. По умолчанию — последняя доступная неделя по данным. "
-        "Можно указать ?week=last|current|next|latest и/или ?week_start=YYYY-MM-DD"
+        "Экспорт выборов комплексов (только админ). По умолчанию — последняя доступная неделя по данным. "
+        "Можно указать ?week=last|current|next|latest и/или ?week_start=YYYY-MM-DD. "
+        "?format=csv|ndjson отдаёт строки потоком прямо из курсора БД, без сборки книги."
     )
 )
-def export_last_week_choices(
-    db: Session = Depends(db_session),
+async def export_last_week_choices(
+    db: AsyncDb = Depends(async_db_session),
     week: str | None = None,
     week_start: date | None = None,
+    fmt: str = Query(default="xlsx", alias="format"),
 ):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, expected one of: {', '.join(EXPORT_FORMATS)}")
     # Determine target week start
-    target_week_start = _resolve_week_start(db, week, week_start)
-
-    # Use only weekdays Mon-Fri
-    weekdays = [1, 2, 3, 4, 5]
-
-    # Preload available (not closed) complexes per weekday to use as fallback when no choice
-    fallback_by_weekday: dict[int, str] = {}
-    available_rows = db.execute(
-        select(ComplexWeekday.weekday_id, Complex.id, Complex.name)
-        .join(Complex, Complex.id == ComplexWeekday.complex_id)
-        .where(ComplexWeekday.weekday_id.in_(weekdays), Complex.is_closed == False)
-        .order_by(ComplexWeekday.weekday_id, Complex.id)
-    ).all()
-    for wid, cid, cname in available_rows:
-        if wid not in fallback_by_weekday:
-            fallback_by_weekday[wid] = cname
-
-    # Fetch users of classes and LEFT JOIN choices for the selected week (only Mon-Fri), exclude class id=1
-    stmt = (
-        select(
-            Class.id.label("class_id"),
-            Class.number,
-            Class.letter,
-            User.id.label("user_id"),
-            User.lastname,
-            User.name,
-            User.patronymic,
-            UserComplexChoice.weekday_id,
-            Complex.name.label("complex_name"),
+    target_week_start = await db.run(_resolve_week_start, week, week_start)
+    if fmt in STREAM_FORMATS:
+        filename = f"choices_{target_week_start.isoformat()}.{fmt}"
+        return StreamingResponse(
+            stream_choices(target_week_start, fmt),
+            media_type=EXPORT_FORMATS[fmt][1],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
         )
-        .join(User, User.class_id == Class.id)
-        .join(
-            UserComplexChoice,
-            (UserComplexChoice.user_id == User.id)
-            & (UserComplexChoice.week_start == target_week_start)
-            & (UserComplexChoice.weekday_id.in_(weekdays)),
-            isouter=True,
-        )
-        .join(Complex, Complex.id == UserComplexChoice.complex_id, isouter=True)
-        .where(Class.id != 1)
-        .order_by(Class.id, User.lastname, User.name, User.id)
+    # неизменившаяся неделя отдаётся готовым файлом из кэша
+    path = await run_in_threadpool(_cached_xlsx, target_week_start)
+    return _file_response(path, target_week_start, "xlsx")
+
+
+def _cached_xlsx(week_start: date) -> str:
+    # сборка книги нагружает CPU, поэтому и в асинхронном режиме идёт в пуле потоков на своей сессии
+    with SessionLocal() as db:
+        return build_cached_export(db, week_start, week_data_version(db, week_start), "xlsx")
+
+
+def _file_response(path: str, week_start: date, fmt: str) -> FileResponse:
+    _, media_type = EXPORT_FORMATS[fmt]
+    return FileResponse(path, media_type=media_type, filename=f"choices_{week_start.isoformat()}.{fmt}")
+
+
+@router.post(
+    "/jobs",
+    status_code=202,
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Запустить экспорт выборов в фоне (только админ). Неделя задаётся как в /choices/last-week.xlsx, "
+        "format — формат файла. Если данные недели не менялись, задача сразу готова."
+    )
+)
+async def create_export_job(
+    db: AsyncDb = Depends(async_db_session),
+    week: str | None = None,
+    week_start: date | None = None,
+    fmt: str = Query(default="xlsx", alias="format"),
+):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, expected one of: {', '.join(EXPORT_FORMATS)}")
+    target_week_start = await db.run(_resolve_week_start, week, week_start)
+    job = export_jobs.submit(target_week_start, fmt, await db.run(week_data_version, target_week_start))
+    return job.as_dict()
+
+
+@router.post(
+    "/jobs/range",
+    status_code=202,
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Запустить экспорт выборов за период в фоне (только админ): все недели с date_from по date_to в одной книге. "
+        "layout=class — лист на класс, недели рядом; layout=week — лист на неделю. "
+        "Данные классов собираются параллельно в отдельных процессах."
     )
+)
+async def create_range_export_job(
+    date_from: date,
+    date_to: date,
+    layout: str = "class",
+    db: AsyncDb = Depends(async_db_session),
+):
+    if layout not in RANGE_LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported layout, expected one of: {', '.join(RANGE_LAYOUTS)}")
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to is before date_from")
+    weeks = range_weeks(date_from, date_to)
+    if len(weeks) > settings.export_max_weeks:
+        raise HTTPException(status_code=400, detail=f"Range is longer than {settings.export_max_weeks} weeks")
+    job = export_jobs.submit(
+        weeks[0], "xlsx", await db.run(range_data_version, weeks), week_end=weeks[-1], layout=layout
+    )
+    return job.as_dict()
 
-    rows = db.execute(stmt).all()
-
-    # Group rows by class and pivot weekdays to columns per user
-    by_class_users: dict[int, dict[int, dict]] = defaultdict(dict)
-    class_titles: dict[int, str] = {}
-
-    for r in rows:
-        cls_id = r.class_id
-        class_titles[cls_id] = f"{r.number or ''}{(r.letter or '').strip()}".strip() or f"class_{cls_id}"
-        user_bucket = by_class_users[cls_id].setdefault(
-            r.user_id,
-            {
-                "lastname": r.lastname,
-                "name": r.name,
-                "patronymic": r.patronymic,
-                "choices": {i: "" for i in weekdays},
-            },
-        )
-        if r.weekday_id is not None:
-            user_bucket["choices"][int(r.weekday_id)] = r.complex_name or ""
-
-    # Substitute fallbacks for empty choices (Mon-Fri only)
-    for users_map in by_class_users.values():
-        for u in users_map.values():
-            for wid in weekdays:
-                if not u["choices"].get(wid):
-                    u["choices"][wid] = fallback_by_weekday.get(wid, "")
-
-    # Create workbook with openpyxl
-    try:
-        from openpyxl import Workbook
-    except ImportError:  # pragma: no cover
-        raise RuntimeError("openpyxl is required for export. Please add it to requirements and install.")
-
-    wb = Workbook()
-    default_sheet = wb.active
-    wb.remove(default_sheet)
-
-    if not by_class_users:
-        ws = wb.create_sheet("No data")
-        ws.append(["Нет данных за неделю", str(target_week_start)])
+
+@router.get(
+    "/jobs/{job_id}",
+    dependencies=[Depends(require_admin)],
+    description="Статус фоновой задачи экспорта (только админ): pending, running, done или failed."
+)
+async def get_export_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job.as_dict()
+
+
+@router.get(
+    "/jobs/{job_id}/download",
+    dependencies=[Depends(require_admin)],
+    description="Скачать результат готовой задачи экспорта (только админ). Если файл уже удалён из кэша — 410."
+)
+async def download_export_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    if job.week_end is not None:
+        filename = f"choices_{job.week_start.isoformat()}_{job.week_end.isoformat()}.{job.format}"
     else:
-        weekday_headers = ["Пн", "Вт", "Ср", "Чт", "Пт"]
-        for cls_id, users_map in by_class_users.items():
-            # Safety check: skip class id 1
-            if cls_id == 1:
-                continue
-            title = class_titles.get(cls_id, f"class_{cls_id}")
-            safe_title = (
-                title[:31]
-                .replace("/", "-")
-                .replace("\\", "-")
-                .replace("*", "-")
-                .replace("[", "(")
-                .replace("]", ")")
-                .replace(":", "-")
-            )
-            ws = wb.create_sheet(safe_title or f"class_{cls_id}")
-
-            ws.append([
-                "Фамилия",
-                "Имя",
-                "Отчество",
-                *weekday_headers,
-            ])
-
-            sorted_users = sorted(
-                users_map.items(),
-                key=lambda kv: (kv[1]["lastname"] or "", kv[1]["name"] or ""),
-            )
-            for _, u in sorted_users:
-                choices = u["choices"]
-                ws.append([
-                    u["lastname"],
-                    u["name"],
-                    u["patronymic"],
-                    choices.get(1, ""),
-                    choices.get(2, ""),
-                    choices.get(3, ""),
-                    choices.get(4, ""),
-                    choices.get(5, ""),
-                ])
-
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-
-    filename = f"choices_{target_week_start.isoformat()}.xlsx"
-    headers = {
-        "Content-Disposition": f"attachment; filename=\"{filename}\""
-    }
+        filename = f"choices_{job.week_start.isoformat()}.{job.format}"
+    if not os.path.exists(job.path):
+        raise HTTPException(status_code=410, detail="Export file is no longer available, start a new job")
+    return FileResponse(job.path, media_type=EXPORT_FORMATS[job.format][1], filename=filename)
+
+
+@router.get(
+    "/kitchen",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Отчёт для кухни (только админ): число порций по дням, комплексам и классам с итогами. "
+        "Ученики без выбора учитываются с комплексом по умолчанию (поле fallback). "
+        "Неделя задаётся как в /choices/last-week.xlsx. Поддерживает ETag / If-None-Match."
+    )
+)
+async def get_kitchen_report(
+    request: Request,
+    db: AsyncDb = Depends(async_db_session),
+    week: str | None = None,
+    week_start: date | None = None,
+):
+    target_week_start = await db.run(_resolve_week_start, week, week_start)
+    return await cached_json_response_async(
+        request,
+        reports_cache,
+        f"kitchen-{target_week_start.isoformat()}",
+        lambda: db.run_encoded(kitchen_report, encode_report, target_week_start),
+        REPORTS_CACHE_CONTROL,
+    )
+
+
+@router.get(
+    "/kitchen.xlsx",
+    dependencies=[Depends(require_admin)],
+    description="Отчёт для кухни в XLSX (только админ): те же данные, что и /exports/kitchen, одним листом."
+)
+async def export_kitchen_report(
+    db: AsyncDb = Depends(async_db_session),
+    week: str | None = None,
+    week_start: date | None = None,
+):
+    target_week_start = await db.run(_resolve_week_start, week, week_start)
+    data = await reports_cache.get_or_build_async(
+        f"kitchen-{target_week_start.isoformat()}",
+        lambda: db.run_encoded(kitchen_report, encode_report, target_week_start),
+    )
+    filename = f"kitchen_{target_week_start.isoformat()}.xlsx"
     return Response(
-        content=buf.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers,
+        content=await run_in_threadpool(build_kitchen_workbook, json.loads(data)),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
+
+
+@router.get(
+    "/procurement",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Закупка на неделю (только админ): граммы и стоимость по каждому продукту (порции × масса и цена продукта), "
+        "включая комплексы по умолчанию для учеников без выбора. by_weekday=true добавляет разбивку по дням. "
+        "Неделя задаётся как в /choices/last-week.xlsx. Поддерживает ETag / If-None-Match."
+    )
+)
+async def get_procurement_report(
+    request: Request,
+    db: AsyncDb = Depends(async_db_session),
+    week: str | None = None,
+    week_start: date | None = None,
+    by_weekday: bool = False,
+):
+    target_week_start = await db.run(_resolve_week_start, week, week_start)
+    return await cached_json_response_async(
+        request,
+        reports_cache,
+        f"procurement-{target_week_start.isoformat()}-{'days' if by_weekday else 'week'}",
+        lambda: db.run_encoded(procurement_report, encode_report, target_week_start, by_weekday),
+        REPORTS_CACHE_CONTROL,
+    )
+
+
+@router.get(
+    "/summary",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Состояние materialized view weekly_choice_summary, из которого строятся отчёты (только админ): "
+        "есть ли необновлённые изменения, число и длительность обновлений."
+    )
+)
+async def get_summary_stats():
+    return summary_refresher.stats()
+
+
+@router.post(
+    "/summary/refresh",
+    dependencies=[Depends(require_admin)],
+    description="Обновить weekly_choice_summary сейчас, не дожидаясь планировщика (только админ)."
+)
+def refresh_summary():
+    summary_refresher.refresh()
+    return summary_refresher.stats()
@@ -0,0 +1,62 @@
+from typing import Awaitable, Callable, Hashable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.services.cache import SnapshotCache
+
+
+# Cache-Control per route family
+MENU_CACHE_CONTROL = "private, no-cache"
+WEEKDAYS_CACHE_CONTROL = "public, max-age=86400"
+PRODUCT_TYPES_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+PRODUCTS_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+REPORTS_CACHE_CONTROL = "no-cache"
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match uses weak comparison
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cached_json_response(
+    request: Request,
+    cache: SnapshotCache,
+    key: Hashable,
+    build: Callable[[], bytes],
+    cache_control: str,
+) -> Response:
+    """
+    Serve a cached JSON snapshot with a version-derived ETag.
+    A matching If-None-Match is answered with 304 before touching the DB or serializer.
+    """
+    etag = cache.etag(key)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cache.get_or_build(key, build), media_type="application/json", headers=headers)
+
+
+async def cached_json_response_async(
+    request: Request,
+    cache: SnapshotCache,
+    key: Hashable,
+    build: Callable[[], Awaitable[bytes]],
+    cache_control: str,
+) -> Response:
+    """cached_json_response for async def handlers; build is awaited only on a cache miss."""
+    etag = cache.etag(key)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=await cache.get_or_build_async(key, build), media_type="application/json", headers=headers)
@@ -1,22 +1,35 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.api.deps import db_session, require_admin
+from app.api.http_cache import PRODUCT_TYPES_CACHE_CONTROL, cached_json_response
 from app.models.products import ProductType
 from app.schemas.products import ProductTypeCreate, ProductTypeOut, ProductTypeUpdate
+from app.services.cache import product_types_cache
 
 router = APIRouter(prefix="/product-types", tags=["product-types"])
 
+_product_types_adapter = TypeAdapter(List[ProductTypeOut])
+
 
 @router.get(
     "/",
     response_model=List[ProductTypeOut],
     description="Получить все типы продуктов."
 )
-def get_product_types(db: Session = Depends(db_session)):
-    return db.execute(select(ProductType)).scalars().all()
+def get_product_types(request: Request, db: Session = Depends(db_session)):
+    return cached_json_response(
+        request,
+        product_types_cache,
+        "all",
+        lambda: _product_types_adapter.dump_json(
+            _product_types_adapter.validate_python(db.execute(select(ProductType).order_by(ProductType.id)).scalars().all(), from_attributes=True)
+        ),
+        PRODUCT_TYPES_CACHE_CONTROL,
+    )
 
 
 @router.get(
@@ -41,6 +54,7 @@ def create_product_type(payload: ProductTypeCreate, db: Session = Depends(db_ses
     product_type = ProductType(**payload.model_dump())
     db.add(product_type)
     db.commit()
+    product_types_cache.bump()
     db.refresh(product_type)
     return product_type
 
@@ -59,6 +73,7 @@ def update_product_type(product_type_id: int, payload: ProductTypeUpdate, db: Se
         setattr(product_type, k, v)
     db.add(product_type)
     db.commit()
+    product_types_cache.bump()
     db.refresh(product_type)
     return product_type
 
@@ -74,4 +89,5 @@ def delete_product_type(product_type_id: int, db: Session = Depends(db_session))
         raise HTTPException(status_code=404, detail="Product type not found")
     db.delete(product_type)
     db.commit()
+    product_types_cache.bump()
     return {"status": "deleted"}
\ No newline at end of file
@@ -1,14 +1,19 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.api.deps import db_session, require_admin
+from app.api.http_cache import PRODUCTS_CACHE_CONTROL, cached_json_response
 from app.models.products import Product
 from app.schemas.products import ProductCreate, ProductOut, ProductUpdate
+from app.services.cache import menu_cache, products_cache, reports_cache
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+_products_adapter = TypeAdapter(List[ProductOut])
+
 
 @router.post(
     "/",
@@ -20,6 +25,7 @@ def create_product(payload: ProductCreate, db: Session = Depends(db_session)):
     product = Product(**payload.model_dump())
     db.add(product)
     db.commit()
+    products_cache.bump()
     db.refresh(product)
     return product
 
@@ -29,8 +35,16 @@ def create_product(payload: ProductCreate, db: Session = Depends(db_session)):
     response_model=List[ProductOut],
     description="Получить все продукты."
 )
-def get_products(db: Session = Depends(db_session)):
-    return db.execute(select(Product)).scalars().all()
+def get_products(request: Request, db: Session = Depends(db_session)):
+    return cached_json_response(
+        request,
+        products_cache,
+        "all",
+        lambda: _products_adapter.dump_json(
+            _products_adapter.validate_python(db.execute(select(Product).order_by(Product.id)).scalars().all(), from_attributes=True)
+        ),
+        PRODUCTS_CACHE_CONTROL,
+    )
 
 @router.get(
     "/{product_id}",
@@ -58,6 +72,9 @@ def update_product(product_id: int, payload: ProductUpdate, db: Session = Depend
         setattr(product, k, v)
     db.add(product)
     db.commit()
+    menu_cache.bump()
+    products_cache.bump()
+    reports_cache.bump()
     db.refresh(product)
     return product
 
@@ -73,6 +90,9 @@ def delete_product(product_id: int, db: Session = Depends(db_session)):
         raise HTTPException(status_code=404, detail="Product not found")
     db.delete(product)
     db.commit()
+    menu_cache.bump()
+    products_cache.bump()
+    reports_cache.bump()
     return {"status": "deleted"}
 
 
@@ -1,11 +1,16 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.deps import db_session, require_admin, require_self_or_admin
+from app.core.config import settings
 from app.models.users import User
 from app.schemas.users import UserCreate, UserOut, UserUpdate
+from app.services.cache import principal_cache, reports_cache
+from app.services.roster_import import RosterFormatError, import_roster, parse_roster
+from app.services.summary import choices_changed
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -20,10 +25,44 @@ def create_user(payload: UserCreate, db: Session = Depends(db_session)):
     user = User(**payload.model_dump())
     db.add(user)
     db.commit()
+    reports_cache.bump()
     db.refresh(user)
     return user
 
 
+@router.post(
+    "/import",
+    dependencies=[Depends(require_admin)],
+    description=(
+        "Импорт списка учеников из CSV или XLSX (только админ). Первая строка — названия колонок: "
+        "login, password, age, class_id обязательны; name, lastname, patronymic, phone_number, avatar_url, "
+        "user_rate, role_id (по умолчанию роль user), is_complex (по умолчанию true) — по желанию. "
+        "Если хоть одна строка с ошибкой, ничего не создаётся и возвращается отчёт по строкам файла. "
+        "dry_run=true — только проверка."
+    )
+)
+def import_users(file: UploadFile = File(...), dry_run: bool = False, db: Session = Depends(db_session)):
+    try:
+        rows = parse_roster(file.filename or "", file.file.read())
+    except RosterFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if len(rows) > settings.roster_import_max_rows:
+        raise HTTPException(status_code=400, detail=f"Too many rows, at most {settings.roster_import_max_rows} per file")
+    try:
+        report = import_roster(db, rows, dry_run=dry_run)
+    except IntegrityError:
+        # таблицы изменились параллельно с импортом: проверяем файл заново, чтобы назвать причину по строкам
+        db.rollback()
+        report = {**import_roster(db, rows, dry_run=True), "dry_run": dry_run}
+        if not report["errors"]:
+            raise HTTPException(status_code=409, detail="Roster conflicts with concurrent changes, retry")
+    if report["errors"]:
+        raise HTTPException(status_code=400, detail=report)
+    if report["created"]:
+        reports_cache.bump()
+    return report
+
+
 @router.get(
     "/",
     response_model=List[UserOut],
@@ -47,17 +86,23 @@ def get_user(user_id: int, db: Session = Depends(db_session)):
 @router.put(
     "/{user_id}",
     response_model=UserOut,
-    dependencies=[Depends(lambda user_id: require_self_or_admin(user_id))],
+    dependencies=[Depends(require_self_or_admin)],
     description="Обновить пользователя. Разрешено админу или самому пользователю (например, сменить аватар)."
 )
 def update_user(user_id: int, payload: UserUpdate, db: Session = Depends(db_session)):
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    for k, v in payload.model_dump(exclude_unset=True).items():
+    changes = payload.model_dump(exclude_unset=True)
+    if "role_id" in changes and changes["role_id"] != user.role_id:
+        # токены со старой ролью больше не принимаются
+        user.token_version += 1
+    for k, v in changes.items():
         setattr(user, k, v)
     db.add(user)
     db.commit()
+    principal_cache.invalidate(user_id)
+    choices_changed()
     db.refresh(user)
     return user
 
@@ -73,6 +118,8 @@ def delete_user(user_id: int, db: Session = Depends(db_session)):
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(user_id)
+    choices_changed()
     return {"status": "deleted"}
 
 
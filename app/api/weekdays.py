@@ -1,20 +1,30 @@
-from fastapi import APIRouter, Depends
+import json
+
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.api.deps import db_session
+from app.api.deps import async_db_session
+from app.api.http_cache import WEEKDAYS_CACHE_CONTROL, cached_json_response_async
+from app.core.db import AsyncDb
 from app.models.complexes import Weekday
+from app.services.cache import weekdays_cache
 
 
 router = APIRouter(prefix="/weekdays", tags=["weekdays"])
 
 
+def _dump_weekdays(db: Session) -> bytes:
+    rows = db.scalars(select(Weekday).order_by(Weekday.id)).all()
+    return json.dumps([{"id": w.id, "name": w.name} for w in rows], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
 @router.get(
     "/",
     description="Справочник дней недели. Вернёт id и name для маппинга."
 )
-def list_weekdays(db: Session = Depends(db_session)):
-    rows = db.scalars(select(Weekday)).all()
-    return [{"id": w.id, "name": w.name} for w in rows]
-
-
+async def list_weekdays(request: Request, db: AsyncDb = Depends(async_db_session)):
+    # справочник меняется только миграциями, поэтому версия кэша живёт до рестарта
+    return await cached_json_response_async(
+        request, weekdays_cache, "all", lambda: db.run(_dump_weekdays), WEEKDAYS_CACHE_CONTROL
+    )
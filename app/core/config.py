@@ -12,15 +12,67 @@ class Settings(BaseSettings):
     postgres_user: str = Field(default="postgres")
     postgres_password: str = Field(default="postgres")
 
+    # пул psycopg2: синхронные роутеры и фоновые задачи (в синхронном режиме — все запросы)
+    db_pool_size: int = Field(default=5)
+    db_max_overflow: int = Field(default=10)
+    # DB_ASYNC=true: горячие роутеры ходят в БД через asyncpg без пула потоков.
+    # Пул asyncpg отдельный и работает вместе с пулом psycopg2, поэтому воркер держит до
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW соединений
+    db_async: bool = Field(default=False)
+    db_async_pool_size: int = Field(default=5)
+    db_async_max_overflow: int = Field(default=10)
+
     jwt_secret: str = Field(default="devsecret")
     jwt_algorithm: str = Field(default="HS256")
-    jwt_exp_minutes: int = Field(default=60)
+    # access-токен живёт недолго, дальше его продлевают refresh-токеном через /auth/refresh
+    jwt_exp_minutes: int = Field(default=15)
+    refresh_token_days: int = Field(default=30)
+    # как часто подтягивать из БД сессии, отозванные другими процессами
+    session_denylist_sync_s: int = Field(default=5)
+    # кэш принципалов для get_current_principal: сколько живёт запись и сколько пользователей держим
+    auth_cache_ttl_s: float = Field(default=60.0)
+    auth_cache_size: int = Field(default=10000)
+    # pbkdf2 считается в отдельных процессах; сверх max_pending ожидающих вызовов — 503
+    password_hash_processes: int = Field(default=2)
+    password_hash_max_pending: int = Field(default=64)
+    # импорт списка учеников: процессы для хеширования (0 — все ядра) и предел строк в файле
+    roster_import_processes: int = Field(default=0)
+    roster_import_max_rows: int = Field(default=5000)
 
     admin_login: str = Field(default="admin")
     admin_password: str = Field(default="admin")
     admin_phone: str = Field(default="0000000000")
     admin_avatar_url: str = Field(default="")
 
+    # group commit for /complexes/week/next/choices (off by default)
+    choices_group_commit: bool = Field(default=False)
+    choices_batch_size: int = Field(default=64)
+    choices_batch_wait_ms: int = Field(default=5)
+    choices_commit_timeout_s: float = Field(default=10.0)
+
+    # дедлайн выбора по умолчанию: за столько часов до начала недели (понедельник 00:00)
+    choices_cutoff_hours_before: int = Field(default=0)
+
+    # готовые выгрузки, ключ — неделя + версия данных
+    export_cache_dir: str = Field(default="var/exports")
+    export_workers: int = Field(default=1)
+    # процессы для выгрузок за несколько недель: данные каждого класса собираются отдельно
+    export_processes: int = Field(default=4)
+    export_max_weeks: int = Field(default=53)
+    # готовить выгрузку текущей и следующей недели заранее (после заморозки и после правок)
+    export_pregenerate: bool = Field(default=True)
+    export_pregenerate_interval_s: int = Field(default=60)
+
+    scheduler_enabled: bool = Field(default=True)
+    freeze_check_interval_s: int = Field(default=60)
+    # проверка, что партиции user_complex_choices на ближайшие месяцы созданы
+    partition_check_interval_s: int = Field(default=3600)
+
+    # weekly_choice_summary: refresh after writes go quiet, but no later than max delay; plus a periodic refresh
+    summary_refresh_debounce_s: float = Field(default=2.0)
+    summary_refresh_max_delay_s: float = Field(default=30.0)
+    summary_refresh_interval_s: float = Field(default=300.0)
+
     @property
     def database_url(self) -> str:
         return (
@@ -28,6 +80,13 @@ class Settings(BaseSettings):
             f"@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
 
+    @property
+    def async_database_url(self) -> str:
+        return (
+            f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}"
+            f"@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
+        )
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,16 +1,42 @@
+from typing import AsyncIterator, Callable, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 
 from app.core.config import settings
 
 
+T = TypeVar("T")
+
+
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(settings.database_url, echo=settings.debug, future=True)
+engine = create_engine(
+    settings.database_url,
+    echo=settings.debug,
+    future=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+# второй пул на asyncpg создаётся только в асинхронном режиме и не заменяет первый:
+# синхронные роутеры и фоновые задачи всегда на psycopg2
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+if settings.db_async:
+    async_engine = create_async_engine(
+        settings.async_database_url,
+        echo=settings.debug,
+        pool_size=settings.db_async_pool_size,
+        max_overflow=settings.db_async_max_overflow,
+    )
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -20,3 +46,47 @@ def get_db():
         db.close()
 
 
+class AsyncDb:
+    """
+    Database handle for async def handlers.
+
+    run(fn, *args) calls fn(session, *args) with a regular sync Session, so the service
+    code is shared by both modes. With DB_ASYNC it is the AsyncSession's session driven
+    through asyncpg on the event loop (run_sync), otherwise a psycopg2 Session in
+    Starlette's threadpool.
+    """
+
+    def __init__(self, session: Session | AsyncSession):
+        self.session = session
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.session, AsyncSession)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(fn, *args)
+        return await run_in_threadpool(fn, self.session, *args)
+
+    async def run_encoded(self, fn: Callable[..., T], encode: Callable[[T], bytes], *args) -> bytes:
+        """
+        encode(fn(session, *args)). With DB_ASYNC run_sync executes fn on the event loop, so
+        encode (JSON of a whole menu or report, CPU only) goes to the threadpool on its own.
+        """
+        if isinstance(self.session, AsyncSession):
+            data = await self.session.run_sync(fn, *args)
+            return await run_in_threadpool(encode, data)
+        return await run_in_threadpool(lambda: encode(fn(self.session, *args)))
+
+
+async def get_async_db() -> AsyncIterator[AsyncDb]:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield AsyncDb(session)
+        return
+    db = SessionLocal()
+    try:
+        yield AsyncDb(db)
+    finally:
+        # close() может отправить ROLLBACK через psycopg2: не блокируем им цикл событий
+        await run_in_threadpool(db.close)
@@ -1,4 +1,10 @@
+import logging
+from contextlib import asynccontextmanager
+from datetime import date
+
 from fastapi import FastAPI, APIRouter
+from app.core.config import settings
+from app.core.db import engine, SessionLocal
 from app.api import users as users_router
 from app.api import products as products_router
 from app.api import complexes as complexes_router
@@ -8,10 +14,65 @@ from app.api import classes as classes_router
 from app.api import product_types as product_types_router
 from app.api import weekdays as weekdays_router
 from app.api import exports as exports_router
+from app.services.choice_writer import choice_writer
+from app.services.choices_export import pregenerate_exports
+from app.services.export_jobs import export_jobs
+from app.services.freeze import freeze_due_weeks
+from app.services.partitions import ensure_upcoming_partitions
+from app.services.password_hasher import password_hasher
+from app.services.refresh_tokens import purge_refresh_tokens, session_denylist
+from app.services.scheduler import process_scheduler, scheduler
+from app.services.summary import summary_refresher
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        ensure_upcoming_partitions(engine, date.today())
+    except Exception:
+        logger.exception("could not create upcoming user_complex_choices partitions")
+    try:
+        session_denylist.sync(SessionLocal)
+    except Exception:
+        logger.exception("could not load revoked sessions")
+    if settings.choices_group_commit:
+        choice_writer.start()
+    # правки этого процесса помечают витрину грязной только у него, поэтому обновляет её каждый процесс
+    process_scheduler.add_job("refresh-choice-summary", 1, summary_refresher.tick)
+    # отзывы сессий из других процессов: у каждого процесса свой список в памяти
+    process_scheduler.add_job(
+        "sync-session-denylist", settings.session_denylist_sync_s, lambda: session_denylist.sync(SessionLocal)
+    )
+    process_scheduler.start()
+    if settings.scheduler_enabled:
+        # процесс может жить дольше трёх месяцев, созданных при старте
+        scheduler.add_job(
+            "ensure-choice-partitions", settings.partition_check_interval_s,
+            lambda: ensure_upcoming_partitions(engine, date.today()),
+        )
+        scheduler.add_job("freeze-weeks", settings.freeze_check_interval_s, lambda: freeze_due_weeks(SessionLocal))
+        scheduler.add_job("purge-refresh-tokens", 3600, lambda: purge_refresh_tokens(SessionLocal))
+        if settings.export_pregenerate:
+            # после freeze-weeks, чтобы только что замороженная неделя сразу попала в кэш
+            scheduler.add_job(
+                "pregenerate-exports", settings.export_pregenerate_interval_s, lambda: pregenerate_exports(SessionLocal)
+            )
+        scheduler.start()
+    try:
+        yield
+    finally:
+        scheduler.stop()
+        process_scheduler.stop()
+        choice_writer.stop()
+        export_jobs.shutdown()
+        password_hasher.shutdown()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="FoodAPI", version="0.1.0", docs_url="/api/docs", redoc_url="/api/redoc", openapi_url="/api/openapi.json")
+    app = FastAPI(title="FoodAPI", version="0.1.0", docs_url="/api/docs", redoc_url="/api/redoc", openapi_url="/api/openapi.json", lifespan=lifespan)
 
     api = APIRouter(prefix="/api")
 
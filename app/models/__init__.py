@@ -10,6 +10,8 @@ from app.models.complexes import (
     ComplexProduct,
     Weekday,
     ComplexWeekday,
+    ComplexSchedule,
+    UserComplexChoice,
 )  # noqa: F401
-
-
+from app.models.snapshots import ChoiceWeek, ChoiceSnapshot  # noqa: F401
+from app.models.tokens import RefreshToken  # noqa: F401
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import date
 from typing import List
 
-from sqlalchemy import Boolean, ForeignKey, Integer, String, Date
+from sqlalchemy import Boolean, ForeignKey, Index, Integer, String, Date
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
@@ -17,14 +17,24 @@ class Complex(Base):
     creation_date: Mapped[date] = mapped_column(Date, nullable=False)
     is_closed: Mapped[bool] = mapped_column(Boolean, nullable=False)
 
+    # read-side relationships; links are written through ComplexProduct / ComplexWeekday rows
+    products: Mapped[List["Product"]] = relationship(
+        "Product", secondary="complex_products", viewonly=True, order_by="Product.id"
+    )
+    weekdays: Mapped[List["Weekday"]] = relationship(
+        "Weekday", secondary="complex_weekdays", viewonly=True, order_by="Weekday.id"
+    )
+
 
 class UserComplexChoice(Base):
     __tablename__ = "user_complex_choices"
+    # помесячные партиции создаются миграцией и app.services.partitions
+    __table_args__ = {"postgresql_partition_by": "RANGE (week_start)"}
 
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True, default=date.today)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     weekday_id: Mapped[int] = mapped_column(ForeignKey("weekdays.id", ondelete="CASCADE"), primary_key=True)
     complex_id: Mapped[int] = mapped_column(ForeignKey("complexes.id", ondelete="CASCADE"), nullable=False)
-    week_start: Mapped[date] = mapped_column(Date, nullable=False, default=date.today)
 
 
 class UserComplex(Base):
@@ -55,3 +65,12 @@ class ComplexWeekday(Base):
     weekday_id: Mapped[int] = mapped_column(ForeignKey("weekdays.id", ondelete="RESTRICT"), primary_key=True)
 
 
+class ComplexSchedule(Base):
+    # меню конкретной недели: если у недели есть строки, они заменяют постоянное меню complex_weekdays
+    __tablename__ = "complex_schedule"
+    __table_args__ = (Index("idx_complex_schedule_complex_id", "complex_id"),)
+
+    # PK (week_start, weekday_id, complex_id) doubles as the per-week lookup index
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    weekday_id: Mapped[int] = mapped_column(ForeignKey("weekdays.id", ondelete="RESTRICT"), primary_key=True)
+    complex_id: Mapped[int] = mapped_column(ForeignKey("complexes.id", ondelete="CASCADE"), primary_key=True)
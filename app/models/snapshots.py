@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import Date, DateTime, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.db import Base
+
+
+class ChoiceWeek(Base):
+    __tablename__ = "choice_weeks"
+
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    # NULL — дедлайн по умолчанию из настроек
+    cutoff_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    frozen_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # weekday_id -> имя комплекса по умолчанию на момент заморозки
+    fallback: Mapped[Optional[dict]] = mapped_column(JSONB)
+    # weekday_id -> id того же комплекса, для отчётов кухни и закупки
+    fallback_ids: Mapped[Optional[dict]] = mapped_column(JSONB)
+
+
+class ChoiceSnapshot(Base):
+    # денормализованный выбор замороженной недели: одна строка на ученика
+    __tablename__ = "choice_snapshots"
+    __table_args__ = (Index("idx_choice_snapshots_week_class", "week_start", "class_id"),)
+
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    class_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    class_title: Mapped[str] = mapped_column(String(255), nullable=False)
+    lastname: Mapped[Optional[str]] = mapped_column(String(255))
+    name: Mapped[Optional[str]] = mapped_column(String(255))
+    patronymic: Mapped[str] = mapped_column(String(255), nullable=False)
+    # [{"weekday_id", "complex_id", "complex": ComplexOut}] — как в /week/*/choices
+    items: Mapped[list] = mapped_column(JSONB, nullable=False)
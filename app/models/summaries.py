@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Date, Integer, MetaData, Table
+
+
+# Materialized view created by migration b7d41e2c9a10 and refreshed by
+# app.services.summary. It lives in its own MetaData so create_all and
+# autogenerate never treat it as a table.
+view_metadata = MetaData()
+
+weekly_choice_summary = Table(
+    "weekly_choice_summary",
+    view_metadata,
+    Column("week_start", Date, primary_key=True),
+    Column("class_id", Integer, primary_key=True),
+    Column("weekday_id", Integer, primary_key=True),
+    Column("complex_id", Integer, primary_key=True),
+    Column("choices", Integer, nullable=False),
+)
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, String, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.db import Base
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("idx_refresh_tokens_user_id", "user_id"),
+        # синхронизация списка отозванных сессий читает только отозванные строки
+        Index("idx_refresh_tokens_revoked_at", "revoked_at", postgresql_where=text("revoked_at IS NOT NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # sha256 от выданного токена, сам токен не хранится
+    token_hash: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    # сессия: цепочка токенов от одного логина, она же claim "sid" в access-токенах
+    family_id: Mapped[str] = mapped_column(String(32), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # токен обменян на следующий; повторное предъявление — признак кражи
+    used_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    replaced_by: Mapped[Optional[int]] = mapped_column(BigInteger)
+    # отозвана вся сессия
+    revoked_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
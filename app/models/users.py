@@ -48,6 +48,8 @@ class User(Base):
     role_id: Mapped[int] = mapped_column(ForeignKey("users_roles.id"), nullable=False)
     is_complex: Mapped[bool] = mapped_column(Boolean, nullable=False)
     password_hash: Mapped[Optional[str]] = mapped_column(String(255))
+    # растёт при смене пароля или роли; выданные раньше токены перестают приниматься
+    token_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     clazz: Mapped[Class] = relationship("Class", back_populates="users")
     role: Mapped[UserRole] = relationship("UserRole", back_populates="users")
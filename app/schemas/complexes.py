@@ -24,6 +24,7 @@ class ComplexUpdate(BaseModel):
     is_closed: Optional[bool] = None
     product_ids: Optional[List[int]] = None
     weekday_ids: Optional[List[int]] = None
+    week_start: Optional[date] = None
 
 
 class ComplexOut(ComplexBase):
@@ -43,4 +44,13 @@ class ChoicesSetIn(BaseModel):
     items: List[ChoiceItem]
 
 
+class UserChoicesIn(BaseModel):
+    user_id: int
+    items: List[ChoiceItem]
+
 
+class ClassChoicesSetIn(BaseModel):
+    week_start: Optional[date] = None
+    # один комплекс на день для всего класса; явные users[].items имеют приоритет
+    everyone: List[ChoiceItem] = []
+    users: List[UserChoicesIn] = []
@@ -38,6 +38,22 @@ class UserUpdate(BaseModel):
     is_complex: Optional[bool] = None
 
 
+class RosterRow(BaseModel):
+    """One line of a roster upload (POST /users/import); column names match the fields."""
+    login: str = Field(min_length=1, max_length=255)
+    password: str = Field(min_length=1)
+    name: Optional[str] = Field(default=None, max_length=255)
+    lastname: Optional[str] = Field(default=None, max_length=255)
+    patronymic: str = Field(default="", max_length=255)
+    age: int
+    class_id: int
+    phone_number: str = Field(default="", max_length=50)
+    avatar_url: str = ""
+    user_rate: int = 0
+    role_id: Optional[int] = None
+    is_complex: bool = True
+
+
 class UserOut(UserBase):
     id: int
     klass: Optional[ClassOut] = Field(
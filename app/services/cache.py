@@ -0,0 +1,163 @@
+import asyncio
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.core.config import settings
+
+
+# versions restart from zero with the process, so tags also carry a per-boot token
+_BOOT_TOKEN = secrets.token_hex(4)
+
+
+class SnapshotCache:
+    """
+    In-process cache of pre-serialized payloads guarded by a version counter.
+
+    Writers call bump() after commit; readers get the stored bytes until the next bump.
+    A snapshot built while a bump happened is returned but not stored, so a slow reader
+    never resurrects stale data. Only one thread rebuilds a given cache at a time.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.version = 0
+        self._entries: dict[Hashable, bytes] = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._async_build_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def bump(self) -> int:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            return self.version
+
+    def etag(self, key: Hashable) -> str:
+        """
+        Strong validator for the payload stored under key at the current version.
+        Must be taken before get_or_build so a concurrent bump can only make it stale.
+        """
+        return f'"{self.name}-{_BOOT_TOKEN}-{self.version}-{key}"'
+
+    def get_or_build(self, key: Hashable, build: Callable[[], bytes]) -> bytes:
+        data = self._entries.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        with self._build_lock:
+            # another thread may have rebuilt it while we were waiting
+            data = self._entries.get(key)
+            if data is not None:
+                return data
+            version = self.version
+            data = build()
+            self.rebuilds += 1
+            with self._lock:
+                if version == self.version:
+                    self._entries[key] = data
+            return data
+
+    async def get_or_build_async(self, key: Hashable, build: Callable[[], Awaitable[bytes]]) -> bytes:
+        """get_or_build for async handlers: rebuilds are serialized on the event loop instead of a thread lock."""
+        data = self._entries.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        async with self._async_build_lock:
+            data = self._entries.get(key)
+            if data is not None:
+                return data
+            version = self.version
+            data = await build()
+            self.rebuilds += 1
+            with self._lock:
+                if version == self.version:
+                    self._entries[key] = data
+            return data
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+        }
+
+
+class PrincipalCache:
+    """
+    LRU of authenticated principals by user id, each entry valid for ttl_s.
+
+    Lets get_current_principal skip the database on most requests. Writers call
+    invalidate(user_id) after committing a change to the user, its role or password;
+    other processes see such changes once the entry expires.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_s: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[int, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, principal: Any) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_s, principal)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """Drop one user's entry, or every entry when user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+menu_cache = SnapshotCache("menu")
+weekdays_cache = SnapshotCache("weekdays")
+product_types_cache = SnapshotCache("product-types")
+products_cache = SnapshotCache("products")
+# reports built from choices; bumped on writes to choices, students, classes, the menu and products
+reports_cache = SnapshotCache("reports")
+principal_cache = PrincipalCache(
+    "principals", max_size=settings.auth_cache_size, ttl_s=settings.auth_cache_ttl_s
+)
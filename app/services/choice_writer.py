@@ -0,0 +1,158 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import date
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.schemas.complexes import ChoiceItem
+from app.services.summary import choices_changed
+from app.services.choices import save_user_choices
+from app.services.partitions import ensure_choice_partition
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChoiceSubmission:
+    user_id: int
+    week_start: date
+    items: list[ChoiceItem]
+    future: Future = field(default_factory=Future)
+
+
+class ChoiceWriteQueue:
+    """
+    Group commit for already validated choice submissions.
+
+    Request threads enqueue a submission and wait on its future; a single writer thread
+    drains up to batch_size submissions (or whatever arrived within batch_wait_ms),
+    writes them on one connection and commits once. If the batch commit fails,
+    submissions are retried one by one so a single bad row only fails its own caller.
+    The week lock is checked again inside the transaction (lock_week_for_write), so a
+    submission queued before a freeze fails with WeekLockedError instead of being lost.
+    """
+
+    def __init__(self, session_factory: sessionmaker, batch_size: int, batch_wait_ms: int):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._batch_wait = batch_wait_ms / 1000
+        self._queue: queue.Queue[ChoiceSubmission | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.submitted = 0
+        self.batches = 0
+        self.committed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="choice-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, user_id: int, week_start: date, items: list[ChoiceItem]) -> Future:
+        self.start()
+        submission = ChoiceSubmission(user_id=user_id, week_start=week_start, items=list(items))
+        self.submitted += 1
+        self._queue.put(submission)
+        return submission.future
+
+    def _collect(self, first: ChoiceSubmission) -> tuple[list[ChoiceSubmission], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self._batch_wait
+        while len(batch) < self._batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if nxt is None:
+                return batch, True
+            batch.append(nxt)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._flush(batch)
+
+    def _write(self, db: Session, batch: list[ChoiceSubmission]) -> None:
+        # партиции всех недель пачки — до первой записи в транзакции
+        for week_start in sorted({sub.week_start for sub in batch}):
+            ensure_choice_partition(db.get_bind(), week_start)
+        for sub in batch:
+            save_user_choices(db, sub.user_id, sub.week_start, sub.items)
+        db.commit()
+        choices_changed()
+
+    def _flush(self, batch: list[ChoiceSubmission]) -> None:
+        self.batches += 1
+        with self._session_factory() as db:
+            try:
+                self._write(db, batch)
+            except Exception:
+                db.rollback()
+                logger.exception("choice batch of %d failed, retrying one by one", len(batch))
+            else:
+                self._resolve(batch, None)
+                return
+
+            for sub in batch:
+                try:
+                    self._write(db, [sub])
+                except Exception as exc:
+                    db.rollback()
+                    self._resolve([sub], exc)
+                else:
+                    self._resolve([sub], None)
+
+    def _resolve(self, batch: list[ChoiceSubmission], exc: Exception | None) -> None:
+        for sub in batch:
+            if exc is None:
+                self.committed += 1
+                sub.future.set_result(None)
+            else:
+                self.failed += 1
+                sub.future.set_exception(exc)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "committed": self.committed,
+            "failed": self.failed,
+        }
+
+
+choice_writer = ChoiceWriteQueue(
+    SessionLocal,
+    batch_size=settings.choices_batch_size,
+    batch_wait_ms=settings.choices_batch_wait_ms,
+)
@@ -0,0 +1,123 @@
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import Date, delete, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.complexes import Complex, UserComplexChoice
+from app.models.users import User
+from app.schemas.complexes import ChoiceItem
+from app.services.freeze import lock_week_for_write
+from app.services.menu import week_offer
+from app.services.partitions import ensure_choice_partition
+
+
+def find_invalid_choices(db: Session, week_start: date, items: Iterable[ChoiceItem]) -> list[ChoiceItem]:
+    """
+    Return items whose complex is not offered on that weekday of the week or is closed.
+    All pairs are checked in a single query against the week's offer.
+    """
+    items = list(items)
+    pairs = {(item.weekday_id, item.complex_id) for item in items}
+    if not pairs:
+        return []
+    offer = week_offer(week_start)
+    offered = set(
+        db.execute(
+            select(offer.c.weekday_id, offer.c.complex_id)
+            .join(Complex, Complex.id == offer.c.complex_id)
+            .where(
+                tuple_(offer.c.weekday_id, offer.c.complex_id).in_(pairs),
+                Complex.is_closed == False,
+            )
+        ).all()
+    )
+    return [item for item in items if (item.weekday_id, item.complex_id) not in offered]
+
+
+def upsert_choices(db: Session, week_start: date, rows: Iterable[tuple[int, int, int]]) -> int:
+    """
+    Write (user_id, weekday_id, complex_id) rows for the week with one multi-row
+    INSERT ... ON CONFLICT DO UPDATE. Does not commit; returns the number of rows sent.
+    Must be the first statement on user_complex_choices in the transaction, see ensure_choice_partition.
+    """
+    values = [
+        {"user_id": user_id, "weekday_id": weekday_id, "complex_id": complex_id, "week_start": week_start}
+        for user_id, weekday_id, complex_id in rows
+    ]
+    if not values:
+        return 0
+    ensure_choice_partition(db.get_bind(), week_start)
+    stmt = pg_insert(UserComplexChoice).values(values)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserComplexChoice.week_start, UserComplexChoice.user_id, UserComplexChoice.weekday_id],
+            set_={"complex_id": stmt.excluded.complex_id},
+        )
+    )
+    return len(values)
+
+
+def save_user_choices(db: Session, user_id: int, week_start: date, items: list[ChoiceItem]) -> None:
+    """
+    Replace a user's choices for the week: drop weekdays missing from items,
+    then upsert the rest in one statement. Does not commit; raises WeekLockedError
+    if the week got locked after the caller's check.
+    """
+    # до DELETE: иначе DDL партиции ждёт блокировку, которую держит эта же транзакция
+    ensure_choice_partition(db.get_bind(), week_start)
+    lock_week_for_write(db, week_start)
+    weekday_ids = [item.weekday_id for item in items]
+    db.execute(
+        delete(UserComplexChoice).where(
+            UserComplexChoice.user_id == user_id,
+            UserComplexChoice.week_start == week_start,
+            UserComplexChoice.weekday_id.not_in(weekday_ids),
+        )
+    )
+    upsert_choices(db, week_start, [(user_id, item.weekday_id, item.complex_id) for item in items])
+
+
+def copy_choices(
+    db: Session,
+    from_week: date,
+    to_week: date,
+    user_id: int | None = None,
+    class_id: int | None = None,
+) -> int:
+    """
+    Copy choices from one week to another with a single INSERT ... SELECT.
+    Choices whose complex is closed or not offered on that weekday of to_week are skipped,
+    and existing choices in to_week are kept. Does not commit; returns the number of rows copied.
+    Raises WeekLockedError if to_week is locked.
+    """
+    ensure_choice_partition(db.get_bind(), to_week)
+    lock_week_for_write(db, to_week)
+    offer = week_offer(to_week)
+    src = (
+        select(
+            UserComplexChoice.user_id,
+            UserComplexChoice.weekday_id,
+            UserComplexChoice.complex_id,
+            literal(to_week, Date),
+        )
+        .join(
+            offer,
+            (offer.c.weekday_id == UserComplexChoice.weekday_id)
+            & (offer.c.complex_id == UserComplexChoice.complex_id),
+        )
+        .join(Complex, Complex.id == UserComplexChoice.complex_id)
+        .where(UserComplexChoice.week_start == from_week, Complex.is_closed == False)
+    )
+    if user_id is not None:
+        src = src.where(UserComplexChoice.user_id == user_id)
+    if class_id is not None:
+        src = src.join(User, User.id == UserComplexChoice.user_id).where(User.class_id == class_id)
+
+    stmt = pg_insert(UserComplexChoice).from_select(
+        ["user_id", "weekday_id", "complex_id", "week_start"], src
+    ).on_conflict_do_nothing(
+        index_elements=[UserComplexChoice.week_start, UserComplexChoice.user_id, UserComplexChoice.weekday_id]
+    )
+    return db.execute(stmt).rowcount
@@ -0,0 +1,494 @@
+import csv
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Iterator
+
+from sqlalchemy import func, select, text, true
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+
+from app.models.users import User, Class
+from app.models.complexes import UserComplexChoice, Complex
+from app.models.snapshots import ChoiceSnapshot, ChoiceWeek
+from app.services.freeze import class_title, is_week_frozen
+from app.services.menu import weekday_fallbacks
+from app.services.weeks import current_monday, next_monday
+from app.services.xlsx import sheet_rows_xml, write_xlsx
+
+
+logger = logging.getLogger(__name__)
+
+
+# Only weekdays Mon-Fri are exported
+WEEKDAYS = [1, 2, 3, 4, 5]
+WEEKDAY_HEADERS = ["Пн", "Вт", "Ср", "Чт", "Пт"]
+SHEET_HEADER = ["Фамилия", "Имя", "Отчество", *WEEKDAY_HEADERS]
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# rows fetched per round trip from the server-side cursor
+YIELD_PER = 1000
+# rows per chunk sent to the client by the streaming formats
+STREAM_CHUNK_ROWS = 500
+# a superseded export file is kept this long after it was last handed out:
+# finished export jobs and responses still being sent may point at it
+EXPORT_FILE_TTL = timedelta(hours=1)
+
+# (class_id, class_title, user_id, lastname, name, patronymic, complex names for WEEKDAYS with fallback applied)
+ExportRow = tuple[int, str, int, str | None, str | None, str, tuple[str, ...]]
+
+
+def safe_sheet_title(title: str, cls_id: int) -> str:
+    safe_title = (
+        title[:31]
+        .replace("/", "-")
+        .replace("\\", "-")
+        .replace("*", "-")
+        .replace("[", "(")
+        .replace("]", ")")
+        .replace(":", "-")
+    )
+    return safe_title or f"class_{cls_id}"
+
+
+def _frozen_fallback(db: Session, week_start: date) -> dict[int, str]:
+    week_row = db.get(ChoiceWeek, week_start)
+    return {int(k): v for k, v in (week_row.fallback or {}).items()}
+
+
+def _iter_live_rows(db: Session, week_start: date, class_id: int | None = None) -> Iterator[ExportRow]:
+    """
+    Users of all classes except id=1 (or of class_id only), one row each with their Mon-Fri complexes.
+    Postgres does the pivot (max(...) FILTER per weekday), substitutes the fallback complex
+    with COALESCE and orders rows by class and name; rows come from a server-side cursor.
+    """
+    cells = weekday_fallbacks(week_start, WEEKDAYS)
+    picked = func.coalesce(Complex.name, cells.c.fallback_name)
+    stmt = (
+        select(
+            Class.id,
+            Class.number,
+            Class.letter,
+            User.id,
+            User.lastname,
+            User.name,
+            User.patronymic,
+            *(
+                func.coalesce(func.max(picked).filter(cells.c.weekday_id == wid), "").label(f"d{wid}")
+                for wid in WEEKDAYS
+            ),
+        )
+        .select_from(Class)
+        .join(User, User.class_id == Class.id)
+        .join(cells, true())
+        .join(
+            UserComplexChoice,
+            (UserComplexChoice.user_id == User.id)
+            & (UserComplexChoice.week_start == week_start)
+            & (UserComplexChoice.weekday_id == cells.c.weekday_id),
+            isouter=True,
+        )
+        .join(Complex, Complex.id == UserComplexChoice.complex_id, isouter=True)
+        .where(Class.id != 1, *([Class.id == class_id] if class_id is not None else []))
+        .group_by(Class.id, User.id)
+        .order_by(Class.id, func.coalesce(User.lastname, ""), func.coalesce(User.name, ""), User.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for cls_id, number, letter, user_id, lastname, name, patronymic, *days in db.execute(stmt):
+        yield cls_id, class_title(cls_id, number, letter), user_id, lastname, name, patronymic, tuple(days)
+
+
+def _iter_frozen_rows(db: Session, week_start: date, class_id: int | None = None) -> Iterator[ExportRow]:
+    fallback = _frozen_fallback(db, week_start)
+    stmt = (
+        select(ChoiceSnapshot)
+        .where(
+            ChoiceSnapshot.week_start == week_start,
+            ChoiceSnapshot.class_id != 1,
+            *([ChoiceSnapshot.class_id == class_id] if class_id is not None else []),
+        )
+        .order_by(
+            ChoiceSnapshot.class_id,
+            func.coalesce(ChoiceSnapshot.lastname, ""),
+            func.coalesce(ChoiceSnapshot.name, ""),
+            ChoiceSnapshot.user_id,
+        )
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for snap in db.scalars(stmt):
+        choices = {item["weekday_id"]: item["complex"]["name"] for item in snap.items}
+        days = tuple(choices.get(wid) or fallback.get(wid, "") for wid in WEEKDAYS)
+        yield snap.class_id, snap.class_title, snap.user_id, snap.lastname, snap.name, snap.patronymic, days
+
+
+def _write_workbook(rows: Iterator[ExportRow], week_start: date, dir: str | None = None) -> str:
+    """
+    Write one sheet per class with openpyxl write-only worksheets and save to a temp file in dir.
+    Write-only sheets spill rows to disk, so memory does not grow with the school size.
+    Returns the file path; the caller moves or removes it.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("openpyxl is required for export. Please add it to requirements and install.")
+
+    wb = Workbook(write_only=True)
+    ws = None
+    current_cls = None
+    for cls_id, title, _, lastname, name, patronymic, days in rows:
+        if cls_id != current_cls:
+            current_cls = cls_id
+            ws = wb.create_sheet(safe_sheet_title(title, cls_id))
+            ws.append(SHEET_HEADER)
+        ws.append([lastname, name, patronymic, *days])
+
+    if ws is None:
+        ws = wb.create_sheet("No data")
+        ws.append(["Нет данных за неделю", str(week_start)])
+
+    fd, path = tempfile.mkstemp(prefix=".choices_", suffix=".xlsx", dir=dir)
+    os.close(fd)
+    try:
+        wb.save(path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+def iter_week_rows(db: Session, week_start: date, class_id: int | None = None) -> Iterator[ExportRow]:
+    """Export rows of a week: from choice_snapshots once frozen, live otherwise."""
+    if is_week_frozen(db, week_start):
+        return _iter_frozen_rows(db, week_start, class_id)
+    return _iter_live_rows(db, week_start, class_id)
+
+
+# Per-class parts of a live week's export version; the menu part is shared by all classes
+_MENU_VERSION_SQL = """
+SELECT
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', id, name, is_closed))), 0)
+       FROM complexes),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', weekday_id, complex_id))), 0)
+       FROM complex_schedule WHERE week_start = :week_start),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', weekday_id, complex_id))), 0)
+       FROM complex_weekdays)
+"""
+
+_CLASS_VERSIONS_SQL = """
+SELECT c.id, concat_ws('|', c.number, c.letter,
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', u.id, u.lastname, u.name, u.patronymic))), 0)
+       FROM users u WHERE u.class_id = c.id),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', ch.user_id, ch.weekday_id, ch.complex_id))), 0)
+       FROM user_complex_choices ch JOIN users u ON u.id = ch.user_id
+       WHERE ch.week_start = :week_start AND u.class_id = c.id))
+FROM classes c
+WHERE c.id != 1
+ORDER BY c.id
+"""
+
+
+def _fragments_dir(week_start: date) -> str:
+    return os.path.join(settings.export_cache_dir, "classes", week_start.isoformat())
+
+
+def _write_fragment(frag_dir: str, path: str, data: bytes) -> None:
+    os.makedirs(frag_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".fragment_", dir=frag_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _drop_other_fragments(frag_dir: str, class_id: int, suffix: str, keep: str) -> None:
+    for old in glob.glob(os.path.join(frag_dir, f"{class_id}_*{suffix}")):
+        if old != keep:
+            try:
+                os.unlink(old)
+            except FileNotFoundError:
+                pass
+
+
+def _class_rows(db: Session, week_start: date, class_id: int, version: str) -> list[ExportRow]:
+    """
+    A class's live rows for the week, reused from its on-disk fragment while the class
+    version (its students, their choices and the week's menu) is unchanged.
+    """
+    frag_dir = _fragments_dir(week_start)
+    path = os.path.join(frag_dir, f"{class_id}_{version}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [(*row[:6], tuple(row[6])) for row in json.load(f)]
+    except FileNotFoundError:
+        pass
+
+    rows = list(_iter_live_rows(db, week_start, class_id))
+    _write_fragment(frag_dir, path, json.dumps(rows, ensure_ascii=False).encode())
+    _drop_other_fragments(frag_dir, class_id, ".json", path)
+    return rows
+
+
+def _class_sheet(db: Session, week_start: date, class_id: int, version: str) -> tuple[str, bytes] | None:
+    """
+    A class's rendered worksheet (title, rows XML) for the week, reused from its on-disk
+    fragment while the class version is unchanged. None for a class without students.
+    """
+    frag_dir = _fragments_dir(week_start)
+    path = os.path.join(frag_dir, f"{class_id}_{version}.sheet")
+    try:
+        with open(path, "rb") as f:
+            # первая строка — название листа, дальше XML строк
+            title, _, rows_xml = f.read().partition(b"\n")
+        return (title.decode(), rows_xml) if title else None
+    except FileNotFoundError:
+        pass
+
+    rows = _class_rows(db, week_start, class_id, version)
+    sheet = None
+    if rows:
+        title = safe_sheet_title(rows[0][1], class_id).replace("\n", " ")
+        sheet = title, sheet_rows_xml(
+            [SHEET_HEADER, *([lastname, name, patronymic, *days] for _, _, _, lastname, name, patronymic, days in rows)]
+        )
+    _write_fragment(frag_dir, path, sheet[0].encode() + b"\n" + sheet[1] if sheet else b"")
+    _drop_other_fragments(frag_dir, class_id, ".sheet", path)
+    return sheet
+
+
+def _live_class_versions(db: Session, week_start: date) -> list[tuple[int, str]]:
+    """(class_id, version) of every exported class of a live week, in sheet order."""
+    params = {"week_start": week_start}
+    menu = "|".join(str(v) for v in db.execute(text(_MENU_VERSION_SQL), params).one())
+    return [
+        (cls_id, hashlib.md5(f"{menu}|{part}".encode()).hexdigest()[:16])
+        for cls_id, part in db.execute(text(_CLASS_VERSIONS_SQL), params).all()
+    ]
+
+
+def _iter_export_rows(db: Session, week_start: date) -> Iterator[ExportRow]:
+    """
+    Rows for file exports. Frozen weeks read their snapshots; live weeks are assembled from
+    per-class fragments, so after an edit only the changed classes are queried again.
+    """
+    if is_week_frozen(db, week_start):
+        return _iter_frozen_rows(db, week_start)
+    return chain.from_iterable(
+        _class_rows(db, week_start, cls_id, version) for cls_id, version in _live_class_versions(db, week_start)
+    )
+
+
+def build_choices_workbook(db: Session, week_start: date, dir: str | None = None) -> str:
+    """
+    XLSX export of a week. A frozen week is rendered once from its snapshot with openpyxl.
+    A live week is assembled from per-class worksheet fragments, so after an edit only the
+    changed classes are queried and rendered again; the rest is copied into the zip as is.
+    """
+    if is_week_frozen(db, week_start):
+        return _write_workbook(_iter_frozen_rows(db, week_start), week_start, dir)
+    sheets = [
+        sheet
+        for cls_id, version in _live_class_versions(db, week_start)
+        if (sheet := _class_sheet(db, week_start, cls_id, version)) is not None
+    ]
+    if not sheets:
+        sheets = [("No data", sheet_rows_xml([["Нет данных за неделю", str(week_start)]]))]
+    fd, path = tempfile.mkstemp(prefix=".choices_", suffix=".xlsx", dir=dir)
+    os.close(fd)
+    try:
+        write_xlsx(path, sheets)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _csv_chunks(rows: Iterator[ExportRow]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(
+        ["class_id", "class", "user_id", "lastname", "name", "patronymic", *(f"weekday_{wid}" for wid in WEEKDAYS)]
+    )
+    for n, (cls_id, title, user_id, lastname, name, patronymic, days) in enumerate(rows, 1):
+        writer.writerow([cls_id, title, user_id, lastname, name, patronymic, *days])
+        if n % STREAM_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+
+def _ndjson_chunks(rows: Iterator[ExportRow]) -> Iterator[bytes]:
+    lines = []
+    for cls_id, title, user_id, lastname, name, patronymic, days in rows:
+        lines.append(json.dumps({
+            "class_id": cls_id,
+            "class": title,
+            "user_id": user_id,
+            "lastname": lastname,
+            "name": name,
+            "patronymic": patronymic,
+            "choices": dict(zip(map(str, WEEKDAYS), days)),
+        }, ensure_ascii=False))
+        if len(lines) == STREAM_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+# streaming formats: rows go from the server-side cursor to the client chunk by chunk
+STREAM_FORMATS = {
+    "csv": _csv_chunks,
+    "ndjson": _ndjson_chunks,
+}
+
+
+def stream_choices(week_start: date, fmt: str) -> Iterator[bytes]:
+    """
+    Encoded export chunks for a streaming response. Opens its own session, since the body
+    is produced after the request's dependencies have been torn down.
+    """
+    with SessionLocal() as db:
+        yield from STREAM_FORMATS[fmt](iter_week_rows(db, week_start))
+
+
+def _write_stream(db: Session, week_start: date, fmt: str, dir: str | None = None) -> str:
+    fd, path = tempfile.mkstemp(prefix=".choices_", suffix=f".{fmt}", dir=dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in STREAM_FORMATS[fmt](_iter_export_rows(db, week_start)):
+                f.write(chunk)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+def build_choices_csv(db: Session, week_start: date, dir: str | None = None) -> str:
+    return _write_stream(db, week_start, "csv", dir)
+
+
+def build_choices_ndjson(db: Session, week_start: date, dir: str | None = None) -> str:
+    return _write_stream(db, week_start, "ndjson", dir)
+
+
+# format -> (builder, media type)
+EXPORT_FORMATS = {
+    "xlsx": (build_choices_workbook, XLSX_MEDIA_TYPE),
+    "csv": (build_choices_csv, CSV_MEDIA_TYPE),
+    "ndjson": (build_choices_ndjson, NDJSON_MEDIA_TYPE),
+}
+
+
+# Everything a week's export depends on, folded into count + sum of row hashes per table
+_LIVE_VERSION_SQL = """
+SELECT
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', user_id, weekday_id, complex_id))), 0)
+       FROM user_complex_choices WHERE week_start = :week_start),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', id, class_id, lastname, name, patronymic))), 0)
+       FROM users),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', id, number, letter))), 0)
+       FROM classes),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', id, name, is_closed))), 0)
+       FROM complexes),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', weekday_id, complex_id))), 0)
+       FROM complex_schedule WHERE week_start = :week_start),
+    (SELECT count(*) || ':' || coalesce(sum(hashtext(concat_ws(':', weekday_id, complex_id))), 0)
+       FROM complex_weekdays)
+"""
+
+
+def week_data_version(db: Session, week_start: date) -> str:
+    """
+    Version of the data behind a week's export. A frozen week never changes, so its
+    freeze time is enough; a live week is fingerprinted with one aggregate query.
+    """
+    if is_week_frozen(db, week_start):
+        week_row = db.get(ChoiceWeek, week_start)
+        return f"frozen{week_row.frozen_at:%Y%m%d%H%M%S}"
+    row = db.execute(text(_LIVE_VERSION_SQL), {"week_start": week_start}).one()
+    return hashlib.md5("|".join(str(v) for v in row).encode()).hexdigest()[:16]
+
+
+def export_cache_path(week_start: date, version: str, fmt: str) -> str:
+    return os.path.join(settings.export_cache_dir, f"choices_{week_start.isoformat()}_{version}.{fmt}")
+
+
+def touch_export(path: str) -> bool:
+    """Mark a cached file as just handed out (its mtime), so pruning keeps it. False if it is gone."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def prune_export_versions(pattern: str, keep: str) -> None:
+    """Remove files matching pattern, except keep, that were not handed out for EXPORT_FILE_TTL."""
+    threshold = (datetime.now() - EXPORT_FILE_TTL).timestamp()
+    for old in glob.glob(pattern):
+        if old == keep:
+            continue
+        try:
+            if os.path.getmtime(old) < threshold:
+                os.unlink(old)
+        except FileNotFoundError:
+            pass
+
+
+def build_cached_export(db: Session, week_start: date, version: str, fmt: str) -> str:
+    """
+    Return the cached export file for (week_start, version, fmt), building it if missing.
+    Older versions of the same week and format are removed once nothing can still refer
+    to them, see EXPORT_FILE_TTL.
+    """
+    path = export_cache_path(week_start, version, fmt)
+    if touch_export(path):
+        return path
+    os.makedirs(settings.export_cache_dir, exist_ok=True)
+    builder, _ = EXPORT_FORMATS[fmt]
+    tmp_path = builder(db, week_start, dir=settings.export_cache_dir)
+    os.replace(tmp_path, path)
+    prune_export_versions(export_cache_path(week_start, "*", fmt), path)
+    return path
+
+
+def pregenerate_exports(session_factory: sessionmaker, now: datetime | None = None) -> list[date]:
+    """
+    Keep the XLSX export of the current and the next week ready in the export cache, so
+    the Monday rush is served from disk. A week frozen at its cutoff is rendered once from
+    its snapshot; an open week is rebuilt when its data version changes, querying and
+    rendering only the classes that changed. Superseded files age out as in
+    build_cached_export, and fragments of frozen weeks are removed. Returns the weeks
+    that were (re)built.
+    """
+    today = (now or datetime.now()).date()
+    rendered = []
+    with session_factory() as db:
+        for week_start in sorted({current_monday(today), next_monday(today)}):
+            version = week_data_version(db, week_start)
+            path = export_cache_path(week_start, version, "xlsx")
+            if not os.path.exists(path):
+                build_cached_export(db, week_start, version, "xlsx")
+                rendered.append(week_start)
+            else:
+                prune_export_versions(export_cache_path(week_start, "*", "xlsx"), path)
+        for frag_dir in glob.glob(os.path.join(settings.export_cache_dir, "classes", "*")):
+            try:
+                week_start = date.fromisoformat(os.path.basename(frag_dir))
+            except ValueError:
+                continue
+            if is_week_frozen(db, week_start):
+                shutil.rmtree(frag_dir, ignore_errors=True)
+    if rendered:
+        logger.info("pre-generated choices export for %s", ", ".join(map(str, rendered)))
+    return rendered
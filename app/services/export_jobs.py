@@ -0,0 +1,137 @@
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.services.choices_export import EXPORT_FILE_TTL, build_cached_export, export_cache_path, touch_export
+from app.services.range_export import build_cached_range_export, range_cache_path, range_weeks, shutdown_pool
+
+
+logger = logging.getLogger(__name__)
+
+# finished jobs are forgotten after this; their files stay in the cache at least as long
+JOB_TTL = EXPORT_FILE_TTL
+
+
+@dataclass
+class ExportJob:
+    id: str
+    week_start: date
+    format: str
+    version: str
+    # set for multi-week exports: last week of the range and sheet layout
+    week_end: date | None = None
+    layout: str | None = None
+    status: str = "pending"  # pending | running | done | failed
+    path: str | None = None
+    error: str | None = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: datetime | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "week_start": str(self.week_start),
+            "week_end": str(self.week_end) if self.week_end else None,
+            "layout": self.layout,
+            "format": self.format,
+            "version": self.version,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ExportJobManager:
+    """
+    Builds exports off the request path on a small dedicated pool.
+    Results live in the on-disk export cache keyed by week, data version and format,
+    so a job for an unchanged week completes immediately, and concurrent requests
+    for the same key share one job.
+    """
+
+    def __init__(self, session_factory: sessionmaker, workers: int):
+        self._session_factory = session_factory
+        self._workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._jobs: dict[str, ExportJob] = {}
+        self._active: dict[tuple, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        week_start: date,
+        fmt: str,
+        version: str,
+        week_end: date | None = None,
+        layout: str | None = None,
+    ) -> ExportJob:
+        key = (week_start, week_end, layout, version, fmt)
+        with self._lock:
+            self._prune()
+            active = self._active.get(key)
+            if active is not None:
+                return active
+            job = ExportJob(
+                id=uuid.uuid4().hex,
+                week_start=week_start,
+                format=fmt,
+                version=version,
+                week_end=week_end,
+                layout=layout,
+            )
+            self._jobs[job.id] = job
+            if week_end is not None:
+                path = range_cache_path(range_weeks(week_start, week_end), layout, version)
+            else:
+                path = export_cache_path(week_start, version, fmt)
+            if touch_export(path):
+                job.status, job.path, job.finished_at = "done", path, datetime.now()
+                return job
+            self._active[key] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="export")
+        self._executor.submit(self._run, job, key)
+        return job
+
+    def get(self, job_id: str) -> ExportJob | None:
+        return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        shutdown_pool()
+
+    def _run(self, job: ExportJob, key: tuple) -> None:
+        job.status = "running"
+        try:
+            with self._session_factory() as db:
+                if job.week_end is not None:
+                    weeks = range_weeks(job.week_start, job.week_end)
+                    job.path = build_cached_range_export(db, weeks, job.layout, job.version)
+                else:
+                    job.path = build_cached_export(db, job.week_start, job.version, job.format)
+            job.status = "done"
+        except Exception as exc:
+            logger.exception("export job %s failed", job.id)
+            job.status, job.error = "failed", str(exc)
+        finally:
+            job.finished_at = datetime.now()
+            with self._lock:
+                self._active.pop(key, None)
+
+    def _prune(self) -> None:
+        threshold = datetime.now() - JOB_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < threshold]:
+            del self._jobs[job_id]
+
+
+export_jobs = ExportJobManager(SessionLocal, workers=settings.export_workers)
@@ -0,0 +1,188 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+
+from app.core.config import settings
+from app.models.complexes import Complex, UserComplexChoice
+from app.models.snapshots import ChoiceSnapshot, ChoiceWeek
+from app.models.users import Class, User
+from app.schemas.complexes import ComplexOut
+from app.services.menu import week_offer
+from app.services.weeks import current_monday
+
+
+logger = logging.getLogger(__name__)
+
+# заморозка необратима, поэтому уже замороженные недели можно помнить в процессе
+_frozen: set[date] = set()
+
+
+def class_title(class_id: int, number: int | None, letter: str | None) -> str:
+    return f"{number or ''}{(letter or '').strip()}".strip() or f"class_{class_id}"
+
+
+def default_cutoff(week_start: date) -> datetime:
+    return datetime.combine(week_start, time.min) - timedelta(hours=settings.choices_cutoff_hours_before)
+
+
+def _load_week(db: Session, week_start: date) -> ChoiceWeek | None:
+    week = db.get(ChoiceWeek, week_start)
+    if week is not None and week.frozen_at is not None:
+        _frozen.add(week_start)
+    return week
+
+
+def is_week_frozen(db: Session, week_start: date) -> bool:
+    if week_start in _frozen:
+        return True
+    _load_week(db, week_start)
+    return week_start in _frozen
+
+
+def is_week_locked(db: Session, week_start: date, now: datetime | None = None) -> bool:
+    """
+    A week is locked for writes once it is frozen or its cutoff has passed.
+    """
+    if week_start in _frozen:
+        return True
+    week = _load_week(db, week_start)
+    if week_start in _frozen:
+        return True
+    cutoff = week.cutoff_at if week is not None and week.cutoff_at else default_cutoff(week_start)
+    return (now or datetime.now()) >= cutoff
+
+
+class WeekLockedError(Exception):
+    """Choices for the week can no longer change: it is frozen or past its cutoff."""
+
+
+def lock_week_for_write(db: Session, week_start: date, now: datetime | None = None) -> None:
+    """
+    Check the lock again inside the write transaction, before it touches user_complex_choices.
+
+    The week's choice_weeks row is created if needed and read FOR SHARE. freeze_week takes
+    FOR UPDATE on the same row, so a write either commits before the week is copied into
+    choice_snapshots or waits for the freeze and sees frozen_at. Raises WeekLockedError.
+    """
+    db.execute(pg_insert(ChoiceWeek).values(week_start=week_start).on_conflict_do_nothing())
+    week = db.execute(
+        select(ChoiceWeek)
+        .where(ChoiceWeek.week_start == week_start)
+        .with_for_update(read=True)
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    if week.frozen_at is not None:
+        _frozen.add(week_start)
+        raise WeekLockedError(f"choices for week {week_start} are frozen")
+    if (now or datetime.now()) >= (week.cutoff_at or default_cutoff(week_start)):
+        raise WeekLockedError(f"choices for week {week_start} are past the cutoff")
+
+
+def freeze_week(db: Session, week_start: date, now: datetime | None = None) -> bool:
+    """
+    Copy the week's choices into choice_snapshots, one denormalized row per student with
+    class, names and chosen complexes (products included) inlined, and record the
+    fallback complex per weekday (name for exports, id for reports). Commits; returns
+    False if the week was already frozen.
+    """
+    now = now or datetime.now()
+    db.execute(pg_insert(ChoiceWeek).values(week_start=week_start).on_conflict_do_nothing())
+    week = db.execute(
+        select(ChoiceWeek)
+        .where(ChoiceWeek.week_start == week_start)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    if week.frozen_at is not None:
+        db.rollback()
+        _frozen.add(week_start)
+        return False
+
+    choices = db.execute(
+        select(UserComplexChoice.user_id, UserComplexChoice.weekday_id, Complex)
+        .join(Complex, Complex.id == UserComplexChoice.complex_id)
+        .where(UserComplexChoice.week_start == week_start)
+        .options(selectinload(Complex.products))
+        .order_by(UserComplexChoice.user_id, UserComplexChoice.weekday_id)
+    ).all()
+    serialized: dict[int, dict] = {}
+    items_by_user: dict[int, list[dict]] = defaultdict(list)
+    for user_id, weekday_id, complex_obj in choices:
+        data = serialized.get(complex_obj.id)
+        if data is None:
+            data = serialized[complex_obj.id] = ComplexOut.model_validate(complex_obj).model_dump(mode="json")
+        items_by_user[user_id].append({"weekday_id": weekday_id, "complex_id": complex_obj.id, "complex": data})
+
+    users = db.execute(
+        select(User.id, User.lastname, User.name, User.patronymic, Class.id, Class.number, Class.letter)
+        .join(Class, Class.id == User.class_id)
+    ).all()
+    rows = [
+        {
+            "week_start": week_start,
+            "user_id": user_id,
+            "class_id": cls_id,
+            "class_title": class_title(cls_id, number, letter),
+            "lastname": lastname,
+            "name": name,
+            "patronymic": patronymic,
+            "items": items_by_user.get(user_id, []),
+        }
+        for user_id, lastname, name, patronymic, cls_id, number, letter in users
+    ]
+    if rows:
+        db.execute(insert(ChoiceSnapshot), rows)
+
+    offer = week_offer(week_start)
+    fallback: dict[str, str] = {}
+    fallback_ids: dict[str, int] = {}
+    for weekday_id, complex_id, complex_name in db.execute(
+        select(offer.c.weekday_id, Complex.id, Complex.name)
+        .join(Complex, Complex.id == offer.c.complex_id)
+        .where(Complex.is_closed == False)
+        .order_by(offer.c.weekday_id, Complex.id)
+    ).all():
+        fallback.setdefault(str(weekday_id), complex_name)
+        fallback_ids.setdefault(str(weekday_id), complex_id)
+
+    week.frozen_at = now
+    week.fallback = fallback
+    week.fallback_ids = fallback_ids
+    db.commit()
+    _frozen.add(week_start)
+    logger.info("froze choices for week %s: %d students", week_start, len(rows))
+    return True
+
+
+def freeze_due_weeks(session_factory: sessionmaker, now: datetime | None = None) -> list[date]:
+    """
+    Freeze every week whose cutoff has passed: last, current and next week by default
+    cutoff, plus any week with an explicit cutoff_at in the past.
+    """
+    now = now or datetime.now()
+    current = current_monday(now.date())
+    candidates = {current - timedelta(days=7), current, current + timedelta(days=7)}
+    frozen = []
+    with session_factory() as db:
+        candidates.update(
+            db.scalars(
+                select(ChoiceWeek.week_start).where(
+                    ChoiceWeek.frozen_at.is_(None),
+                    ChoiceWeek.cutoff_at <= now,
+                )
+            ).all()
+        )
+        for week_start in sorted(candidates):
+            if is_week_locked(db, week_start, now) and not is_week_frozen(db, week_start):
+                if freeze_week(db, week_start, now):
+                    frozen.append(week_start)
+    return frozen
+
+
+def load_frozen_choices(db: Session, user_id: int, week_start: date) -> dict:
+    row = db.get(ChoiceSnapshot, (week_start, user_id))
+    return {"week_start": str(week_start), "items": row.items if row is not None else []}
@@ -0,0 +1,130 @@
+from datetime import date
+
+from pydantic import TypeAdapter
+from sqlalchemy import Integer, Subquery, column, exists, literal, select, true, union_all, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.complexes import Complex, ComplexSchedule, ComplexWeekday, UserComplexChoice
+from app.schemas.complexes import ComplexOut
+
+
+_week_menu_adapter = TypeAdapter(dict[int, list[ComplexOut]])
+
+
+def week_offer(week_start: date) -> Subquery:
+    """
+    (weekday_id, complex_id) pairs offered on the given week, closed complexes included.
+    A week with complex_schedule rows is served from them alone (read by their primary
+    key); a week without any falls back to the recurring complex_weekdays links.
+    """
+    scheduled = ComplexSchedule.week_start == week_start
+    own = select(ComplexSchedule.weekday_id, ComplexSchedule.complex_id).where(scheduled)
+    recurring = select(ComplexWeekday.weekday_id, ComplexWeekday.complex_id).where(~exists().where(scheduled))
+    return union_all(own, recurring).subquery("offer")
+
+
+def ensure_week_schedule(db: Session, week_start: date) -> None:
+    """
+    Before the first change to a week's own menu, copy the recurring links into its
+    complex_schedule, so editing one complex does not drop the rest of the week's menu.
+    """
+    if db.scalar(select(exists().where(ComplexSchedule.week_start == week_start))):
+        return
+    db.execute(
+        pg_insert(ComplexSchedule)
+        .from_select(
+            ["week_start", "weekday_id", "complex_id"],
+            select(literal(week_start), ComplexWeekday.weekday_id, ComplexWeekday.complex_id),
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def weekday_fallbacks(week_start: date, weekday_ids: list[int]) -> Subquery:
+    """
+    One row per weekday in weekday_ids: weekday_id plus fallback_id / fallback_name of the
+    first open complex offered that weekday (LATERAL ... LIMIT 1), NULL if nothing is open.
+    Students without a choice for the day are assigned this complex.
+    """
+    wd = values(column("weekday_id", Integer), name="wd").data([(wid,) for wid in weekday_ids])
+    offer = week_offer(week_start)
+    first_open = (
+        select(Complex.id, Complex.name)
+        .join(offer, offer.c.complex_id == Complex.id)
+        .where(offer.c.weekday_id == wd.c.weekday_id, Complex.is_closed == False)
+        .order_by(Complex.id)
+        .limit(1)
+        .lateral("first_open")
+    )
+    return (
+        select(
+            wd.c.weekday_id,
+            first_open.c.id.label("fallback_id"),
+            first_open.c.name.label("fallback_name"),
+        )
+        .select_from(wd)
+        .join(first_open, true(), isouter=True)
+        .subquery("cells")
+    )
+
+
+def load_week_menu(db: Session, week_start: date) -> dict[int, list[ComplexOut]]:
+    """
+    Load open complexes of the week grouped by weekday_id in two queries:
+    one for the week's offer and one selectin query for products.
+    Every complex is serialized once and shared between its weekdays.
+    """
+    offer = week_offer(week_start)
+    rows = db.execute(
+        select(offer.c.weekday_id, Complex)
+        .join(Complex, Complex.id == offer.c.complex_id)
+        .where(Complex.is_closed == False)
+        .options(selectinload(Complex.products))
+        .order_by(offer.c.weekday_id, Complex.id)
+    ).all()
+
+    serialized: dict[int, ComplexOut] = {}
+    result: dict[int, list[ComplexOut]] = {}
+    for weekday_id, complex_obj in rows:
+        complex_out = serialized.get(complex_obj.id)
+        if complex_out is None:
+            complex_out = serialized[complex_obj.id] = ComplexOut.model_validate(complex_obj)
+        result.setdefault(weekday_id, []).append(complex_out)
+    return result
+
+
+def encode_week_menu(menu: dict[int, list[ComplexOut]]) -> bytes:
+    """
+    Serialized week menu; stored in menu_cache, so Postgres is only hit after an admin write.
+    """
+    return _week_menu_adapter.dump_json(menu)
+
+
+def load_user_choices(db: Session, user_id: int, week_start: date) -> dict:
+    """
+    Load a user's choices for the given week together with complex products (two queries).
+    """
+    rows = db.execute(
+        select(UserComplexChoice.weekday_id, Complex)
+        .join(Complex, Complex.id == UserComplexChoice.complex_id)
+        .where(
+            UserComplexChoice.user_id == user_id,
+            UserComplexChoice.week_start == week_start,
+        )
+        .options(selectinload(Complex.products))
+        .order_by(UserComplexChoice.weekday_id)
+    ).all()
+
+    serialized: dict[int, ComplexOut] = {}
+    items = []
+    for weekday_id, complex_obj in rows:
+        complex_out = serialized.get(complex_obj.id)
+        if complex_out is None:
+            complex_out = serialized[complex_obj.id] = ComplexOut.model_validate(complex_obj)
+        items.append({
+            "weekday_id": weekday_id,
+            "complex_id": complex_obj.id,
+            "complex": complex_out,
+        })
+    return {"week_start": str(week_start), "items": items}
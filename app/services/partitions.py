@@ -0,0 +1,98 @@
+import re
+import threading
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.services.weeks import week_monday
+
+
+PARENT = "user_complex_choices"
+_PARTITION_RE = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+_ensured: set[date] = set()
+_lock = threading.Lock()
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_y{month:%Y}m{month:%m}"
+
+
+def ensure_choice_partition(bind: Engine, week_start: date) -> None:
+    """
+    Make sure the monthly partition holding week_start exists.
+    DDL runs on its own connection, at most once per month per process.
+
+    Call it before the caller's transaction touches user_complex_choices: CREATE ... PARTITION OF
+    waits for an ACCESS EXCLUSIVE lock on the parent, and a lock already held by that
+    transaction on the same thread would make it wait forever.
+    """
+    month = _month_start(week_start)
+    if month in _ensured:
+        return
+    with _lock:
+        if month in _ensured:
+            return
+        with bind.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_month(month).isoformat()}')"
+            ))
+        _ensured.add(month)
+
+
+def ensure_upcoming_partitions(bind: Engine, today: date, months: int = 3) -> None:
+    month = _month_start(today)
+    for _ in range(months):
+        ensure_choice_partition(bind, month)
+        month = _add_month(month)
+
+
+def list_choice_partitions(bind: Engine) -> list[dict]:
+    with bind.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bounds, "
+            "c.reltuples::bigint AS approx_rows "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent ORDER BY c.relname"
+        ), {"parent": PARENT}).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def latest_detach_bound(today: date) -> date:
+    """The latest `before` detach_choice_partitions may be given: the month of the current week's Monday."""
+    return _month_start(week_monday(today))
+
+
+def detach_choice_partitions(bind: Engine, before: date) -> list[str]:
+    """
+    Detach monthly partitions that end on or before `before` and rename them to
+    user_complex_choices_archive_yYYYYmMM. The data stays in place until dropped by hand.
+    """
+    detached = []
+    for part in list_choice_partitions(bind):
+        m = _PARTITION_RE.match(part["name"])
+        if not m:
+            continue
+        month = date(int(m.group(1)), int(m.group(2)), 1)
+        if _add_month(month) > before:
+            continue
+        archive = f"{PARENT}_archive_y{month:%Y}m{month:%m}"
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {part['name']}"))
+            conn.execute(text(f"ALTER TABLE {part['name']} RENAME TO {archive}"))
+        with _lock:
+            _ensured.discard(month)
+        detached.append(archive)
+    return detached
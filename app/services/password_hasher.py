@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import multiprocessing
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import settings
+from app.core.security import hash_password, verify_password
+
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(RuntimeError):
+    """More hashing work is pending than max_pending allows."""
+
+
+class PasswordHasher:
+    """
+    Runs pbkdf2 hashing and verification in a process pool, so a burst of logins does
+    not hold the GIL of the API process. At most max_pending calls may be queued or
+    running; past that submit() raises PasswordHasherBusy instead of queueing forever.
+    """
+
+    def __init__(self, processes: int, max_pending: int, latency_window: int = 1000):
+        self._processes = processes
+        self._max_pending = max_pending
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: the API process runs threads, forking it could copy held locks and open connections
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self._max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy("password hashing queue is full")
+            try:
+                future = self._get_pool().submit(fn, *args)
+            except BrokenProcessPool:
+                # воркер умер (OOM, kill): пул больше не принимает задачи, поднимаем новый
+                logger.warning("password hashing pool is broken, restarting it")
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.restarts += 1
+                future = self._get_pool().submit(fn, *args)
+            self._pending += 1
+        started = time.perf_counter()
+
+        def done(_: Future) -> None:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self._latencies.append((time.perf_counter() - started) * 1000)
+
+        future.add_done_callback(done)
+        return future
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(hash_password, password))
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self.submit(verify_password, password, hashed))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            pending = self._pending
+        return {
+            "processes": self._processes,
+            "max_pending": self._max_pending,
+            "queue_depth": pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "latency_ms": {
+                "median": round(statistics.median(latencies), 1) if latencies else None,
+                "p95": round(latencies[int(len(latencies) * 0.95)], 1) if latencies else None,
+                "max": round(latencies[-1], 1) if latencies else None,
+            },
+        }
+
+
+password_hasher = PasswordHasher(
+    processes=settings.password_hash_processes,
+    max_pending=settings.password_hash_max_pending,
+)
@@ -0,0 +1,153 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.users import Class
+from app.services.choices_export import (
+    WEEKDAY_HEADERS,
+    iter_week_rows,
+    prune_export_versions,
+    safe_sheet_title,
+    touch_export,
+    week_data_version,
+)
+from app.services.weeks import week_monday
+
+
+# "class": one sheet per class with the weeks side by side; "week": one sheet per week
+RANGE_LAYOUTS = ("class", "week")
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def range_weeks(date_from: date, date_to: date) -> list[date]:
+    first, last = week_monday(date_from), week_monday(date_to)
+    return [first + timedelta(days=7 * i) for i in range((last - first).days // 7 + 1)]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process runs threads, forking it could copy held locks and open connections
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.export_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _class_sheet_data(class_id: int, weeks: list[date]) -> tuple[int, str, dict[date, list[tuple]]]:
+    """
+    Worker process entry point: rows of one class for every week in the range,
+    as (class_id, title, {week_start: [(user_id, lastname, name, patronymic, days)]}).
+    """
+    from app.core.db import SessionLocal
+
+    title = f"class_{class_id}"
+    by_week: dict[date, list[tuple]] = {}
+    with SessionLocal() as db:
+        for week_start in weeks:
+            rows = []
+            for _, cls_title, user_id, lastname, name, patronymic, days in iter_week_rows(db, week_start, class_id):
+                title = cls_title
+                rows.append((user_id, lastname, name, patronymic, days))
+            by_week[week_start] = rows
+    return class_id, title, by_week
+
+
+def range_data_version(db: Session, weeks: list[date]) -> str:
+    versions = "|".join(f"{w.isoformat()}={week_data_version(db, w)}" for w in weeks)
+    return hashlib.md5(versions.encode()).hexdigest()[:16]
+
+
+def _write_range_workbook(classes: list[tuple[int, str, dict]], weeks: list[date], layout: str, dir: str | None) -> str:
+    try:
+        from openpyxl import Workbook
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("openpyxl is required for export. Please add it to requirements and install.")
+
+    wb = Workbook(write_only=True)
+    if layout == "class":
+        for cls_id, title, by_week in classes:
+            students: dict[int, tuple] = {}
+            for rows in by_week.values():
+                for user_id, lastname, name, patronymic, _ in rows:
+                    students.setdefault(user_id, (lastname, name, patronymic))
+            if not students:
+                continue
+            days = {(w, row[0]): row[4] for w, rows in by_week.items() for row in rows}
+            ws = wb.create_sheet(safe_sheet_title(title, cls_id))
+            ws.append([
+                "Фамилия", "Имя", "Отчество",
+                *(f"{w:%d.%m} {h}" for w in weeks for h in WEEKDAY_HEADERS),
+            ])
+            order = sorted(students, key=lambda u: (students[u][0] or "", students[u][1] or "", u))
+            blank = ("",) * len(WEEKDAY_HEADERS)
+            for user_id in order:
+                ws.append([*students[user_id], *(c for w in weeks for c in days.get((w, user_id), blank))])
+    else:
+        for week_start in weeks:
+            ws = wb.create_sheet(week_start.isoformat())
+            ws.append(["Класс", "Фамилия", "Имя", "Отчество", *WEEKDAY_HEADERS])
+            for _, title, by_week in classes:
+                for _, lastname, name, patronymic, days in by_week.get(week_start, []):
+                    ws.append([title, lastname, name, patronymic, *days])
+
+    if not wb.worksheets:
+        ws = wb.create_sheet("No data")
+        ws.append(["Нет данных за период", weeks[0].isoformat(), weeks[-1].isoformat()])
+
+    fd, path = tempfile.mkstemp(prefix=".choices_", suffix=".xlsx", dir=dir)
+    os.close(fd)
+    try:
+        wb.save(path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+def build_range_workbook(db: Session, weeks: list[date], layout: str, dir: str | None = None) -> str:
+    """
+    One workbook for several weeks. Each class's rows for all weeks are built in a
+    worker process (EXPORT_PROCESSES) and the sheets are assembled here in class order.
+    """
+    class_ids = db.scalars(select(Class.id).where(Class.id != 1).order_by(Class.id)).all()
+    pool = _get_pool()
+    futures = [pool.submit(_class_sheet_data, cls_id, weeks) for cls_id in class_ids]
+    classes = [f.result() for f in futures]
+    return _write_range_workbook(classes, weeks, layout, dir)
+
+
+def range_cache_path(weeks: list[date], layout: str, version: str) -> str:
+    name = f"choices_range_{weeks[0].isoformat()}_{weeks[-1].isoformat()}_{layout}_{version}.xlsx"
+    return os.path.join(settings.export_cache_dir, name)
+
+
+def build_cached_range_export(db: Session, weeks: list[date], layout: str, version: str) -> str:
+    path = range_cache_path(weeks, layout, version)
+    if touch_export(path):
+        return path
+    os.makedirs(settings.export_cache_dir, exist_ok=True)
+    tmp_path = build_range_workbook(db, weeks, layout, dir=settings.export_cache_dir)
+    os.replace(tmp_path, path)
+    prune_export_versions(range_cache_path(weeks, layout, "*"), path)
+    return path
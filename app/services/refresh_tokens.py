@@ -0,0 +1,154 @@
+import hashlib
+import secrets
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.models.tokens import RefreshToken
+
+
+class RefreshTokenError(Exception):
+    """Unknown, expired, revoked or reused refresh token."""
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionDenylist:
+    """
+    Revoked sessions (refresh token families) whose access tokens may still be unexpired.
+
+    get_current_principal checks the access token's "sid" here, so revocation costs no
+    query per request. Revocations made in this process are added right away; those made
+    by other processes arrive with sync(), which process_scheduler runs every few seconds
+    in every process, SCHEDULER_ENABLED or not.
+    An entry is dropped once every access token of that session has expired.
+    """
+
+    # запас на расхождение часов между процессами, пишущими revoked_at
+    SYNC_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self, ttl: timedelta):
+        self._ttl = ttl
+        self._entries: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._cursor: datetime | None = None
+        self.syncs = 0
+
+    def add(self, family_id: str, revoked_at: datetime | None = None) -> None:
+        expires = (revoked_at or datetime.now()) + self._ttl
+        with self._lock:
+            if self._entries.get(family_id, datetime.min) < expires:
+                self._entries[family_id] = expires
+
+    def __contains__(self, family_id: str) -> bool:
+        if not self._entries:
+            return False
+        expires = self._entries.get(family_id)
+        return expires is not None and expires > datetime.now()
+
+    def sync(self, session_factory: sessionmaker) -> int:
+        now = datetime.now()
+        since = now - self._ttl
+        if self._cursor is not None:
+            since = max(since, self._cursor - self.SYNC_OVERLAP)
+        with session_factory() as db:
+            rows = db.execute(
+                select(RefreshToken.family_id, func.max(RefreshToken.revoked_at))
+                .where(RefreshToken.revoked_at > since)
+                .group_by(RefreshToken.family_id)
+            ).all()
+        for family_id, revoked_at in rows:
+            self.add(family_id, revoked_at)
+            if self._cursor is None or revoked_at > self._cursor:
+                self._cursor = revoked_at
+        with self._lock:
+            for family_id in [f for f, expires in self._entries.items() if expires <= now]:
+                del self._entries[family_id]
+        self.syncs += 1
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "syncs": self.syncs, "cursor": self._cursor}
+
+
+session_denylist = SessionDenylist(ttl=timedelta(minutes=settings.jwt_exp_minutes))
+
+
+def issue_refresh_token(db: Session, user_id: int, family_id: str | None = None) -> tuple[str, RefreshToken]:
+    """A new opaque refresh token; only its sha256 is stored. The caller commits."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.now()
+    row = RefreshToken(
+        user_id=user_id,
+        token_hash=_digest(token),
+        family_id=family_id or uuid.uuid4().hex,
+        created_at=now,
+        expires_at=now + timedelta(days=settings.refresh_token_days),
+    )
+    db.add(row)
+    db.flush()
+    return token, row
+
+
+def revoke_sessions(db: Session, *, family_id: str | None = None, user_id: int | None = None) -> list[str]:
+    """
+    Mark one session, or every session of a user, revoked and return their ids.
+    The caller commits and then passes the ids to session_denylist.add.
+    """
+    stmt = update(RefreshToken).where(RefreshToken.revoked_at.is_(None))
+    if family_id is not None:
+        stmt = stmt.where(RefreshToken.family_id == family_id)
+    if user_id is not None:
+        stmt = stmt.where(RefreshToken.user_id == user_id)
+    rows = db.execute(stmt.values(revoked_at=datetime.now()).returning(RefreshToken.family_id)).scalars().all()
+    return sorted(set(rows))
+
+
+def revoke_refresh_token(db: Session, token: str) -> list[str]:
+    """Revoke the session the token belongs to (logout). Unknown tokens revoke nothing."""
+    family_id = db.scalar(select(RefreshToken.family_id).where(RefreshToken.token_hash == _digest(token)))
+    if family_id is None:
+        return []
+    return revoke_sessions(db, family_id=family_id)
+
+
+def rotate_refresh_token(db: Session, token: str) -> tuple[str, RefreshToken]:
+    """
+    Exchange a refresh token for the next one in its session and commit.
+
+    A token that was already exchanged means it leaked: the whole session is revoked
+    and RefreshTokenError raised, so neither the thief nor the owner can continue it.
+    """
+    row = db.execute(
+        select(RefreshToken).where(RefreshToken.token_hash == _digest(token)).with_for_update()
+    ).scalar_one_or_none()
+    if row is None or row.revoked_at is not None or row.expires_at <= datetime.now():
+        db.rollback()
+        raise RefreshTokenError("invalid refresh token")
+    if row.used_at is not None:
+        families = revoke_sessions(db, family_id=row.family_id)
+        db.commit()
+        for family_id in families:
+            session_denylist.add(family_id)
+        raise RefreshTokenError("refresh token reused, session revoked")
+
+    new_token, new_row = issue_refresh_token(db, row.user_id, row.family_id)
+    row.used_at = datetime.now()
+    row.replaced_by = new_row.id
+    db.commit()
+    return new_token, new_row
+
+
+def purge_refresh_tokens(session_factory: sessionmaker) -> int:
+    """Delete tokens expired for longer than an access token lives; they can no longer matter."""
+    cutoff = datetime.now() - timedelta(minutes=settings.jwt_exp_minutes)
+    with session_factory() as db:
+        deleted = db.execute(delete(RefreshToken).where(RefreshToken.expires_at < cutoff)).rowcount
+        db.commit()
+    return deleted
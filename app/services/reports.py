@@ -0,0 +1,265 @@
+import io
+import json
+from datetime import date
+
+from sqlalchemy import Integer, Select, Subquery, column, func, literal, select, true, tuple_, union_all, values
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+from app.models.complexes import Complex, ComplexProduct
+from app.models.products import Product
+from app.models.snapshots import ChoiceSnapshot, ChoiceWeek
+from app.models.summaries import weekly_choice_summary
+from app.models.users import Class, User
+from app.services.choices_export import WEEKDAY_HEADERS, WEEKDAYS
+from app.services.freeze import class_title, is_week_frozen
+from app.services.menu import weekday_fallbacks
+
+
+def _with_fallback(chosen: Select, chosen_per_day: Subquery, class_sizes: Subquery, cells: Subquery | None) -> Subquery:
+    """
+    chosen portions plus, per class and weekday, the students without a choice counted for
+    the weekday's fallback complex (cells: weekday_id, fallback_id).
+    """
+    if cells is None:
+        return chosen.subquery("portions")
+    missing = class_sizes.c.students - func.coalesce(chosen_per_day.c.chosen, 0)
+    defaults = (
+        select(class_sizes.c.class_id, cells.c.weekday_id, cells.c.fallback_id, missing, missing)
+        .select_from(class_sizes)
+        .join(cells, true())
+        .join(
+            chosen_per_day,
+            (chosen_per_day.c.class_id == class_sizes.c.class_id)
+            & (chosen_per_day.c.weekday_id == cells.c.weekday_id),
+            isouter=True,
+        )
+        .where(cells.c.fallback_id.is_not(None), missing > 0)
+    )
+    return union_all(chosen, defaults).subquery("portions")
+
+
+def _live_week_portions(week_start: date) -> Subquery:
+    s = weekly_choice_summary.c
+    in_week = (s.week_start == week_start, s.class_id != 1, s.weekday_id.in_(WEEKDAYS))
+    chosen = select(
+        s.class_id,
+        s.weekday_id,
+        s.complex_id,
+        s.choices.label("portions"),
+        literal(0).label("fallback"),
+    ).where(*in_week)
+
+    class_sizes = (
+        select(User.class_id, func.count().label("students"))
+        .where(User.class_id != 1)
+        .group_by(User.class_id)
+        .subquery("class_sizes")
+    )
+    chosen_per_day = (
+        select(s.class_id, s.weekday_id, func.sum(s.choices).label("chosen"))
+        .where(*in_week)
+        .group_by(s.class_id, s.weekday_id)
+        .subquery("chosen_per_day")
+    )
+    return _with_fallback(chosen, chosen_per_day, class_sizes, weekday_fallbacks(week_start, WEEKDAYS))
+
+
+def _frozen_week_portions(week_start: date, fallback_ids: dict | None) -> Subquery:
+    snap = ChoiceSnapshot
+    # элементы items снимка: {"weekday_id", "complex_id", ...}
+    item = func.jsonb_array_elements(snap.items).table_valued(column("value", JSONB)).alias("item")
+    wid = item.c.value["weekday_id"].astext.cast(Integer)
+    cid = item.c.value["complex_id"].astext.cast(Integer)
+    in_week = (snap.week_start == week_start, snap.class_id != 1)
+    chosen = (
+        select(
+            snap.class_id,
+            wid.label("weekday_id"),
+            cid.label("complex_id"),
+            func.count().label("portions"),
+            literal(0).label("fallback"),
+        )
+        .select_from(snap)
+        .join(item, true())
+        .where(*in_week, wid.in_(WEEKDAYS))
+        .group_by(snap.class_id, wid, cid)
+    )
+    class_sizes = (
+        select(snap.class_id, func.count().label("students"))
+        .where(*in_week)
+        .group_by(snap.class_id)
+        .subquery("class_sizes")
+    )
+    chosen_per_day = (
+        select(snap.class_id, wid.label("weekday_id"), func.count().label("chosen"))
+        .select_from(snap)
+        .join(item, true())
+        .where(*in_week, wid.in_(WEEKDAYS))
+        .group_by(snap.class_id, wid)
+        .subquery("chosen_per_day")
+    )
+    if fallback_ids is None:
+        # неделя заморожена до появления fallback_ids: комплекс по умолчанию берём из текущего меню
+        cells = weekday_fallbacks(week_start, WEEKDAYS)
+    else:
+        rows = [(int(wid_), cid_) for wid_, cid_ in fallback_ids.items() if int(wid_) in WEEKDAYS]
+        cells = (
+            values(column("weekday_id", Integer), column("fallback_id", Integer), name="cells").data(rows)
+            if rows else None
+        )
+    return _with_fallback(chosen, chosen_per_day, class_sizes, cells)
+
+
+def week_portions(db: Session, week_start: date) -> Subquery:
+    """
+    Portions per class, weekday and complex for the week (classes except id=1, WEEKDAYS only).
+    Students of a class who made no choice for a day get the weekday's fallback complex,
+    counted in `fallback` as well. A live week reads the weekly_choice_summary view, the
+    users table and the current menu; a frozen week reads only choice_snapshots and the
+    fallback recorded at the freeze, so later edits do not change its counts.
+    """
+    if is_week_frozen(db, week_start):
+        week = db.get(ChoiceWeek, week_start)
+        return _frozen_week_portions(week_start, week.fallback_ids)
+    return _live_week_portions(week_start)
+
+
+def kitchen_report(db: Session, week_start: date) -> dict:
+    """
+    Meal counts per weekday × complex × class with subtotals per complex and weekday and
+    a grand total, from one GROUP BY ROLLUP query over week_portions. `fallback` counts
+    students who got the default complex because they made no choice.
+    """
+    portions = week_portions(db, week_start)
+    wid, cid, cls = portions.c.weekday_id, Complex.id, Class.id
+    stmt = (
+        select(
+            wid,
+            cid.label("complex_id"),
+            Complex.name.label("complex_name"),
+            cls.label("class_id"),
+            Class.number,
+            Class.letter,
+            func.sum(portions.c.portions).label("count"),
+            func.sum(portions.c.fallback).label("fallback"),
+            func.grouping(wid, cid, cls).label("level"),
+        )
+        .select_from(portions)
+        .join(Complex, Complex.id == portions.c.complex_id)
+        .join(Class, Class.id == portions.c.class_id)
+        .group_by(
+            func.rollup(wid, tuple_(cid, Complex.name), tuple_(cls, Class.number, Class.letter))
+        )
+        .order_by(wid.asc().nulls_last(), cid.asc().nulls_last(), cls.asc().nulls_last())
+    )
+
+    report = {"week_start": str(week_start), "count": 0, "fallback": 0, "weekdays": []}
+    weekdays: dict[int, dict] = {}
+    complexes: dict[tuple[int, int], dict] = {}
+    # ROLLUP subtotal rows follow their detail rows thanks to NULLS LAST
+    for r in db.execute(stmt):
+        totals = {"count": int(r.count), "fallback": int(r.fallback)}
+        if r.level == 0b111:
+            report.update(totals)
+            continue
+        day = weekdays.get(r.weekday_id)
+        if day is None:
+            day = weekdays[r.weekday_id] = {"weekday_id": r.weekday_id, "count": 0, "fallback": 0, "complexes": []}
+            report["weekdays"].append(day)
+        if r.level == 0b011:
+            day.update(totals)
+            continue
+        item = complexes.get((r.weekday_id, r.complex_id))
+        if item is None:
+            item = complexes[(r.weekday_id, r.complex_id)] = {
+                "complex_id": r.complex_id, "name": r.complex_name, "count": 0, "fallback": 0, "classes": [],
+            }
+            day["complexes"].append(item)
+        if r.level == 0b001:
+            item.update(totals)
+            continue
+        item["classes"].append({
+            "class_id": r.class_id,
+            "class": class_title(r.class_id, r.number, r.letter),
+            **totals,
+        })
+    return report
+
+
+def encode_report(report: dict) -> bytes:
+    return json.dumps(report, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def procurement_report(db: Session, week_start: date, by_weekday: bool = False) -> dict:
+    """
+    Grams and cost per product for the week: week_portions (fallback included) expanded
+    through complex_products and multiplied by Product.mass and Product.price, aggregated
+    in one GROUP BY ROLLUP query. With by_weekday each product also gets a per-weekday
+    breakdown.
+    """
+    portions = week_portions(db, week_start)
+    wid = portions.c.weekday_id
+    n = portions.c.portions
+    keys = [tuple_(Product.id, Product.name), *([wid] if by_weekday else [])]
+    stmt = (
+        select(
+            Product.id.label("product_id"),
+            Product.name,
+            *keys[1:],
+            func.sum(n).label("portions"),
+            func.sum(n * Product.mass).label("grams"),
+            func.sum(n * Product.price).label("cost"),
+            func.grouping(Product.id).label("is_total"),
+        )
+        .select_from(portions)
+        .join(ComplexProduct, ComplexProduct.complex_id == portions.c.complex_id)
+        .join(Product, Product.id == ComplexProduct.product_id)
+        .group_by(func.rollup(*keys))
+        .order_by(Product.id.asc().nulls_last(), *([wid.asc().nulls_first()] if by_weekday else []))
+    )
+
+    report = {"week_start": str(week_start), "grams": 0, "cost": 0.0, "products": []}
+    current: dict | None = None
+    # per product the ROLLUP total (weekday NULL) comes first, then its weekdays
+    for r in db.execute(stmt):
+        totals = {"portions": int(r.portions), "grams": int(r.grams or 0), "cost": round(float(r.cost or 0), 2)}
+        if r.is_total:
+            report.update(grams=totals["grams"], cost=totals["cost"])
+            continue
+        if by_weekday and r.weekday_id is not None:
+            current["weekdays"].append({"weekday_id": r.weekday_id, **totals})
+            continue
+        current = {"product_id": r.product_id, "name": r.name, **totals}
+        if by_weekday:
+            current["weekdays"] = []
+        report["products"].append(current)
+    return report
+
+
+def build_kitchen_workbook(report: dict) -> bytes:
+    """
+    One sheet with a line per weekday × complex × class, followed by complex and weekday
+    subtotal lines and a grand total, as in the JSON report.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("openpyxl is required for export. Please add it to requirements and install.")
+
+    headers = dict(zip(WEEKDAYS, WEEKDAY_HEADERS))
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(f"Кухня {report['week_start']}")
+    ws.append(["День", "Комплекс", "Класс", "Порций", "Из них по умолчанию"])
+    for day in report["weekdays"]:
+        day_title = headers.get(day["weekday_id"], str(day["weekday_id"]))
+        for item in day["complexes"]:
+            for row in item["classes"]:
+                ws.append([day_title, item["name"], row["class"], row["count"], row["fallback"]])
+            ws.append([day_title, item["name"], "Итого", item["count"], item["fallback"]])
+        ws.append([day_title, "Итого за день", None, day["count"], day["fallback"]])
+    ws.append(["Итого за неделю", None, None, report["count"], report["fallback"]])
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
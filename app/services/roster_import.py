@@ -0,0 +1,165 @@
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import hash_password
+from app.models.users import Class, User, UserRole
+from app.schemas.users import RosterRow
+
+
+class RosterFormatError(ValueError):
+    """The upload is not a readable CSV/XLSX roster."""
+
+
+def _cell(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _read_xlsx(content: bytes) -> list[list]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("openpyxl is required for import. Please add it to requirements and install.")
+    try:
+        wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except Exception as exc:
+        raise RosterFormatError(f"cannot read xlsx: {exc}")
+    try:
+        return [list(row) for row in wb.worksheets[0].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+def _read_csv(content: bytes) -> list[list]:
+    # Excel с русской локалью сохраняет CSV в cp1251 и с разделителем ";"
+    for encoding in ("utf-8-sig", "cp1251"):
+        try:
+            text = content.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise RosterFormatError("cannot decode csv")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.reader(io.StringIO(text), dialect))
+
+
+def parse_roster(filename: str, content: bytes) -> list[tuple[int, dict]]:
+    """
+    (line number, {column: value}) for every non-empty row of the first sheet / the CSV.
+    The first row holds column names matching RosterRow fields; empty cells are omitted.
+    """
+    if filename.lower().endswith(".xlsx"):
+        table = _read_xlsx(content)
+    elif filename.lower().endswith((".csv", ".txt")):
+        table = _read_csv(content)
+    else:
+        raise RosterFormatError("expected a .csv or .xlsx file")
+    if not table:
+        raise RosterFormatError("file is empty")
+
+    header = [(_cell(h) or "").lower() for h in table[0]]
+    unknown = sorted(set(header) - set(RosterRow.model_fields) - {""})
+    if unknown:
+        raise RosterFormatError(f"unknown columns: {', '.join(unknown)}")
+    rows = []
+    for line, values in enumerate(table[1:], start=2):
+        row = {name: v for name, v in zip(header, map(_cell, values)) if name and v is not None}
+        if row:
+            rows.append((line, row))
+    return rows
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """pbkdf2 for a whole roster on every core (ROSTER_IMPORT_PROCESSES, 0 = all)."""
+    workers = min(settings.roster_import_processes or os.cpu_count() or 1, len(passwords))
+    if workers <= 1:
+        return [hash_password(p) for p in passwords]
+    # отдельный пул на время импорта: общий пул логинов ограничен и не должен стоять в очереди за ним
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def import_roster(db: Session, rows: list[tuple[int, dict]], dry_run: bool = False) -> dict:
+    """
+    Validate every row, then insert all users in one multi-row INSERT and one transaction.
+
+    Logins are checked against the file and the users table (one query over idx_users_login),
+    class_id and role_id against their tables (one query each). If any row fails, nothing is
+    inserted and the report lists the errors per file line. Rows without role_id get the
+    "user" role.
+    """
+    parsed: list[tuple[int, RosterRow]] = []
+    errors: dict[int, list[str]] = {}
+    for line, raw in rows:
+        try:
+            parsed.append((line, RosterRow.model_validate(raw)))
+        except ValidationError as exc:
+            errors[line] = [f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()]
+
+    logins = [r.login for _, r in parsed]
+    existing = set(db.scalars(select(User.login).where(User.login.in_(logins)))) if logins else set()
+    wanted_classes = list({r.class_id for _, r in parsed})
+    class_ids = set(db.scalars(select(Class.id).where(Class.id.in_(wanted_classes)))) if wanted_classes else set()
+    roles = dict(db.execute(select(UserRole.id, UserRole.name)).all())
+    default_role = next((rid for rid, name in roles.items() if name == "user"), None)
+
+    seen: dict[str, int] = {}
+    for line, r in parsed:
+        problems = []
+        if r.login in existing:
+            problems.append("login: already registered")
+        elif r.login in seen:
+            problems.append(f"login: duplicate of line {seen[r.login]}")
+        else:
+            seen[r.login] = line
+        if r.class_id not in class_ids:
+            problems.append("class_id: class not found")
+        if r.role_id is None and default_role is None:
+            problems.append("role_id: required, no default role")
+        elif r.role_id is not None and r.role_id not in roles:
+            problems.append("role_id: role not found")
+        if problems:
+            errors.setdefault(line, []).extend(problems)
+
+    report = {
+        "rows": len(rows),
+        "created": 0,
+        "dry_run": dry_run,
+        "errors": [{"line": line, "errors": errors[line]} for line in sorted(errors)],
+    }
+    if errors or dry_run or not parsed:
+        return report
+
+    hashes = hash_passwords([r.password for _, r in parsed])
+    today = date.today()
+    values = [
+        {
+            **r.model_dump(exclude={"password", "role_id"}),
+            "role_id": r.role_id if r.role_id is not None else default_role,
+            "created_at": today,
+            "password_hash": password_hash,
+        }
+        for (_, r), password_hash in zip(parsed, hashes)
+    ]
+    # executemany: psycopg2 собирает строки в многострочный INSERT ... VALUES
+    db.execute(insert(User), values)
+    db.commit()
+    report["created"] = len(values)
+    return report
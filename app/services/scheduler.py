@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Job:
+    name: str
+    interval_s: float
+    func: Callable[[], object]
+    next_run: float = 0.0
+
+
+class PeriodicScheduler:
+    """
+    Runs registered jobs on a single background thread at fixed intervals.
+    A failing job is logged and retried at its next interval.
+    """
+
+    def __init__(self, tick_s: float = 1.0):
+        self._tick_s = tick_s
+        self._jobs: list[_Job] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_job(self, name: str, interval_s: float, func: Callable[[], object]) -> None:
+        self._jobs.append(_Job(name=name, interval_s=interval_s, func=func))
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for job in self._jobs:
+                if now < job.next_run:
+                    continue
+                try:
+                    job.func()
+                except Exception:
+                    logger.exception("scheduled job %s failed", job.name)
+                job.next_run = time.monotonic() + job.interval_s
+            self._stop.wait(self._tick_s)
+
+
+scheduler = PeriodicScheduler()
+# задачи, которые нужны каждому процессу (его собственное состояние в памяти):
+# запускаются всегда, независимо от SCHEDULER_ENABLED
+process_scheduler = PeriodicScheduler()
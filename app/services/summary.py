@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.db import engine
+from app.services.cache import reports_cache
+
+
+logger = logging.getLogger(__name__)
+
+VIEW = "weekly_choice_summary"
+
+
+class SummaryRefresher:
+    """
+    Keeps the weekly_choice_summary materialized view fresh.
+
+    Writers call mark_dirty() after commit. tick() runs every second on process_scheduler,
+    which every process starts even with SCHEDULER_ENABLED=false, and refreshes once writes
+    have been quiet for debounce_s, or at the latest max_delay_s after the first
+    unrefreshed write, so a burst of choices costs one refresh. Independently
+    of writes the view is refreshed every interval_s, which picks up writes from other
+    processes. Reports read the view, so their cache is bumped after each refresh.
+    """
+
+    def __init__(self, bind: Engine, debounce_s: float, max_delay_s: float, interval_s: float):
+        self._bind = bind
+        self._debounce_s = debounce_s
+        self._max_delay_s = max_delay_s
+        self._interval_s = interval_s
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._dirty_since: float | None = None
+        self._last_write = 0.0
+        self._last_refresh = time.monotonic()
+        self.refreshes = 0
+        self.last_refresh_ms: float | None = None
+        self.last_refreshed_at: datetime | None = None
+
+    def mark_dirty(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_write = now
+
+    def tick(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            dirty_since = self._dirty_since
+            due = now - self._last_refresh >= self._interval_s
+            if dirty_since is not None:
+                due = due or now - self._last_write >= self._debounce_s or now - dirty_since >= self._max_delay_s
+        if not due:
+            return False
+        self.refresh()
+        return True
+
+    def refresh(self) -> None:
+        with self._refresh_lock:
+            # writes landing during the refresh mark the view dirty again
+            with self._lock:
+                self._dirty_since = None
+            started = time.perf_counter()
+            try:
+                with self._bind.begin() as conn:
+                    conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {VIEW}"))
+            except Exception:
+                self.mark_dirty()
+                raise
+            finally:
+                self._last_refresh = time.monotonic()
+            self.last_refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.last_refreshed_at = datetime.now()
+            self.refreshes += 1
+        reports_cache.bump()
+
+    def stats(self) -> dict:
+        return {
+            "dirty": self._dirty_since is not None,
+            "refreshes": self.refreshes,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_refreshed_at": self.last_refreshed_at,
+        }
+
+
+summary_refresher = SummaryRefresher(
+    engine,
+    debounce_s=settings.summary_refresh_debounce_s,
+    max_delay_s=settings.summary_refresh_max_delay_s,
+    interval_s=settings.summary_refresh_interval_s,
+)
+
+
+def choices_changed() -> None:
+    """Call after committing a write that changes choices or which class a student is in."""
+    reports_cache.bump()
+    summary_refresher.mark_dirty()
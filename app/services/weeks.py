@@ -0,0 +1,14 @@
+from datetime import date, timedelta
+
+
+def week_monday(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def current_monday(today: date) -> date:
+    return week_monday(today)
+
+
+def next_monday(today: date) -> date:
+    # строго после today: в понедельник «следующая» — через неделю, а не уже начавшаяся
+    return today + timedelta(days=7 - today.weekday())
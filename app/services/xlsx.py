@@ -0,0 +1,117 @@
+"""
+A minimal XLSX writer for workbooks assembled from pre-rendered sheets.
+
+openpyxl renders a whole workbook at once; here every sheet's rows are rendered to
+SpreadsheetML separately (sheet_rows_xml), so a caller can cache them per sheet and only
+re-render the sheets whose data changed. Cells are written as inline strings.
+"""
+import re
+import zipfile
+from typing import Iterable
+from xml.sax.saxutils import escape, quoteattr
+
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_SHEET_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+# управляющие символы недопустимы в XML; openpyxl на них падает, здесь они просто выбрасываются
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_STYLES = (
+    f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+
+def _column(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def sheet_rows_xml(rows: Iterable[Iterable], start_row: int = 1) -> bytes:
+    """The <row> elements for rows of cell values; None and "" leave the cell empty."""
+    parts = []
+    for r, values in enumerate(rows, start_row):
+        cells = "".join(
+            f'<c r="{_column(c)}{r}" t="inlineStr"><is><t xml:space="preserve">'
+            f"{escape(_ILLEGAL_XML_RE.sub('', str(v)))}</t></is></c>"
+            for c, v in enumerate(values)
+            if v is not None and v != ""
+        )
+        parts.append(f'<row r="{r}">{cells}</row>')
+    return "".join(parts).encode()
+
+
+def write_xlsx(path: str, sheets: list[tuple[str, bytes]]) -> None:
+    """
+    Write a workbook with one worksheet per (title, rows XML from sheet_rows_xml).
+    Titles must already be valid sheet names; repeated ones get a numeric suffix as in openpyxl.
+    """
+    titles: list[str] = []
+    for title, _ in sheets:
+        unique, n = title, 0
+        while unique in titles:
+            n += 1
+            unique = f"{title[:31 - len(str(n))]}{n}"
+        titles.append(unique)
+
+    n_sheets = len(sheets)
+    content_types = (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{_SHEET_TYPE}"/>'
+            for i in range(1, n_sheets + 1)
+        )
+        + "</Types>"
+    )
+    root_rels = (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    )
+    workbook = (
+        f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>'
+        + "".join(
+            f'<sheet name={quoteattr(title)} sheetId="{i}" r:id="rId{i}"/>'
+            for i, title in enumerate(titles, 1)
+        )
+        + "</sheets></workbook>"
+    )
+    workbook_rels = (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        + "".join(
+            f'<Relationship Id="rId{i}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, n_sheets + 1)
+        )
+        + f'<Relationship Id="rId{n_sheets + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+        "</Relationships>"
+    )
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", content_types)
+        zf.writestr("_rels/.rels", root_rels)
+        zf.writestr("xl/workbook.xml", workbook)
+        zf.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
+        zf.writestr("xl/styles.xml", _STYLES)
+        for i, (_, rows_xml) in enumerate(sheets, 1):
+            zf.writestr(
+                f"xl/worksheets/sheet{i}.xml",
+                f'<worksheet xmlns="{_MAIN_NS}"><sheetData>'.encode() + rows_xml + b"</sheetData></worksheet>",
+            )
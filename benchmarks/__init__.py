@@ -0,0 +1,15 @@
+"""
+Synthetic-school benchmarks for the export, week menu and choice endpoints.
+
+Point POSTGRES_* at a disposable database migrated with `alembic upgrade head`, then:
+
+    python -m benchmarks.seed --classes 30 --students 25 --complexes 8 --weeks 4 --reset
+    python -m benchmarks.run --repeat 5 --output bench.json
+    python -m benchmarks.run --repeat 5 --compare bench.json --threshold 1.25
+    python -m benchmarks.concurrency --concurrency 16,64,256 --duration 10 --output modes.json
+
+benchmarks.concurrency runs a real uvicorn worker with DB_ASYNC=false and then true and
+compares throughput under concurrent clients.
+
+Extra dependency: httpx (benchmarks/requirements.txt), for FastAPI's TestClient.
+"""
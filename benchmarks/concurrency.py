@@ -0,0 +1,164 @@
+"""
+Compare DB_ASYNC=false and DB_ASYNC=true under concurrent load.
+
+For each mode a single uvicorn worker is started on the seeded database, and every
+scenario is driven by --concurrency clients (httpx.AsyncClient) for --duration seconds.
+Throughput and latency percentiles are written as JSON, one result per mode × scenario ×
+concurrency level.
+
+    python -m benchmarks.concurrency --concurrency 16,64,256 --duration 10 --output modes.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.security import create_access_token
+from app.models.users import User
+
+
+MODES = {"sync": "false", "async": "true"}
+
+# (name, path, as admin); other requests are authenticated as a random seeded student
+SCENARIOS = [
+    ("menu.week.next", "/api/complexes/week/next", False),
+    ("choices.week.next", "/api/complexes/week/next/choices", False),
+    ("weekdays", "/api/weekdays/", False),
+    ("report.kitchen", "/api/exports/kitchen?week=next", True),
+]
+
+
+def _start_server(mode: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "DB_ASYNC": MODES[mode], "SCHEDULER_ENABLED": "false"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            raise SystemExit(f"uvicorn exited with {proc.returncode} in {mode} mode")
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f"uvicorn did not start in {mode} mode")
+
+
+async def _load(base_url: str, path: str, tokens: list[str], concurrency: int, duration: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, headers=headers)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pick(q: float) -> float | None:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))], 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", default="16,64,256", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--only", help="run scenarios whose name starts with this prefix")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--students", type=int, default=500, help="distinct users to authenticate as")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user_ids = db.scalars(
+            select(User.id).where(User.login.like("bench_%")).order_by(User.id).limit(args.students)
+        ).all()
+        admin_id = db.scalar(select(User.id).where(User.login == settings.admin_login))
+    if not user_ids:
+        raise SystemExit("no seeded data found; run python -m benchmarks.seed first")
+    tokens = [create_access_token(str(uid)) for uid in user_ids]
+    admin_tokens = [create_access_token(str(admin_id))]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    scenarios = [s for s in SCENARIOS if not args.only or s[0].startswith(args.only)]
+
+    results = []
+    for mode in args.modes.split(","):
+        proc = _start_server(mode, args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            for name, path, as_admin in scenarios:
+                auth = admin_tokens if as_admin else tokens
+                for concurrency in levels:
+                    asyncio.run(_load(base_url, path, auth, concurrency, args.warmup, args.seed))
+                    stats = asyncio.run(_load(base_url, path, auth, concurrency, args.duration, args.seed))
+                    results.append({"mode": mode, "scenario": name, "concurrency": concurrency, **stats})
+                    print(f"{mode:5} {name:20} c={concurrency:<4} {stats['rps']:>8} rps  p95 {stats['p95_ms']} ms",
+                          file=sys.stderr)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "duration_s": args.duration,
+            "students": len(user_ids),
+        },
+        "results": results,
+    }
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Time the export, week menu and choice submission endpoints against the seeded database
+through the real app (TestClient), and write the results as JSON.
+
+Each benchmark runs --warmup unmeasured and --repeat timed iterations, then one extra
+iteration under tracemalloc for the Python allocation peak. With --compare, medians are
+checked against a previous result file and the run exits with status 1 on regressions.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+import sqlalchemy
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.security import create_access_token
+from app.models.complexes import ComplexWeekday, UserComplexChoice
+from app.models.users import User
+from app.services import cache
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: Callable[[], object]
+    # called before every iteration, outside the timed section
+    setup: Callable[[], object] | None = None
+
+
+def _check(response) -> None:
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url} -> {response.status_code}: {response.text[:200]}")
+
+
+def _measure(bench: Benchmark, warmup: int, repeat: int) -> dict:
+    for _ in range(warmup):
+        if bench.setup:
+            bench.setup()
+        bench.func()
+    timings = []
+    for _ in range(repeat):
+        if bench.setup:
+            bench.setup()
+        started = time.perf_counter()
+        bench.func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if bench.setup:
+        bench.setup()
+    tracemalloc.start()
+    try:
+        bench.func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "name": bench.name,
+        "repeat": repeat,
+        "min_ms": round(timings[0], 2),
+        "median_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_benchmarks(client: TestClient, export_dir: str, submissions: int, seed: int) -> tuple[list[Benchmark], dict]:
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        latest = db.execute(select(UserComplexChoice.week_start).order_by(UserComplexChoice.week_start.desc()).limit(1)).scalar()
+        user_ids = db.scalars(select(User.id).where(User.login.like("bench_%")).order_by(User.id)).all()
+        admin_id = db.scalar(select(User.id).where(User.login == settings.admin_login))
+        offer = db.execute(select(ComplexWeekday.weekday_id, ComplexWeekday.complex_id)).all()
+    if not user_ids or latest is None:
+        raise SystemExit("no seeded data found; run python -m benchmarks.seed first")
+
+    week = latest.isoformat()
+    by_weekday: dict[int, list[int]] = {}
+    for wid, cid in offer:
+        by_weekday.setdefault(wid, []).append(cid)
+    student = {"Authorization": f"Bearer {create_access_token(str(user_ids[0]))}"}
+    # exports and reports are admin-only
+    admin = {"Authorization": f"Bearer {create_access_token(str(admin_id))}"}
+    submitters = [
+        ({"Authorization": f"Bearer {create_access_token(str(uid))}"},
+         {"items": [{"weekday_id": wid, "complex_id": rng.choice(cids)} for wid, cids in sorted(by_weekday.items())]})
+        for uid in rng.sample(user_ids, min(submissions, len(user_ids)))
+    ]
+
+    settings.export_cache_dir = export_dir
+
+    def cold_export_cache():
+        # a new directory per iteration, so neither files nor class fragments are reused
+        settings.export_cache_dir = tempfile.mkdtemp(dir=export_dir)
+
+    def get(url: str, headers: dict | None = None) -> Callable[[], None]:
+        def call():
+            _check(client.get(url, headers=headers))
+        return call
+
+    def submit_choices():
+        for headers, payload in submitters:
+            _check(client.post("/api/complexes/week/next/choices", json=payload, headers=headers))
+
+    benchmarks = [
+        Benchmark("export.xlsx.cold", get(f"/api/exports/choices/last-week.xlsx?week_start={week}", admin), cold_export_cache),
+        Benchmark("export.xlsx.cached", get(f"/api/exports/choices/last-week.xlsx?week_start={week}", admin)),
+        Benchmark("export.csv.stream", get(f"/api/exports/choices/last-week.xlsx?week_start={week}&format=csv", admin)),
+        Benchmark("export.ndjson.stream", get(f"/api/exports/choices/last-week.xlsx?week_start={week}&format=ndjson", admin)),
+        Benchmark("report.kitchen.cold", get(f"/api/exports/kitchen?week_start={week}", admin), cache.reports_cache.bump),
+        Benchmark("report.procurement.cold", get(f"/api/exports/procurement?week_start={week}&by_weekday=true", admin), cache.reports_cache.bump),
+        Benchmark("menu.week.next.cold", get("/api/complexes/week/next", student), cache.menu_cache.bump),
+        Benchmark("menu.week.next.warm", get("/api/complexes/week/next", student)),
+        Benchmark(f"choices.submit.x{len(submitters)}", submit_choices),
+    ]
+    meta = {"week_start": week, "students": len(user_ids), "submissions": len(submitters)}
+    return benchmarks, meta
+
+
+def compare(results: list[dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    regressions = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if base and base["median_ms"] > 0 and r["median_ms"] / base["median_ms"] > threshold:
+            regressions.append(
+                f"{r['name']}: median {r['median_ms']} ms vs {base['median_ms']} ms "
+                f"(x{r['median_ms'] / base['median_ms']:.2f} > x{threshold})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--submissions", type=int, default=200, help="choice submissions per iteration")
+    parser.add_argument("--only", help="run benchmarks whose name starts with this prefix")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON results to check medians against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed median slowdown factor")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    # background jobs would compete with the measured requests
+    settings.scheduler_enabled = False
+
+    from app.main import app
+
+    with tempfile.TemporaryDirectory(prefix="bench_exports_") as export_dir, TestClient(app) as client:
+        benchmarks, meta = build_benchmarks(client, export_dir, args.submissions, args.seed)
+        results = [
+            _measure(b, args.warmup, args.repeat)
+            for b in benchmarks
+            if not args.only or b.name.startswith(args.only)
+        ]
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "choices_group_commit": settings.choices_group_commit,
+            **meta,
+        },
+        "results": results,
+    }
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
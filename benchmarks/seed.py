@@ -0,0 +1,196 @@
+"""
+Seed a synthetic school: N classes × M students, K complexes over a handful of products,
+and W weeks of choices ending with next week. Random but repeatable for a given --seed.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.engine import Engine
+
+from app.core.db import engine
+from app.core.security import hash_password
+from app.models.complexes import Complex, ComplexProduct, ComplexWeekday, UserComplexChoice, Weekday
+from app.models.products import Product, ProductType
+from app.models.users import Class, User, UserRole
+from app.services.partitions import ensure_choice_partition
+from app.services.weeks import next_monday
+
+
+BENCH_PREFIX = "bench"
+STUDENT_PASSWORD = "bench"
+INSERT_CHUNK = 5000
+
+# tables emptied by --reset, in FK order
+_RESET_TABLES = [
+    "choice_snapshots",
+    "choice_weeks",
+    "user_complex_choices",
+    "complex_schedule",
+    "complex_weekdays",
+    "complex_products",
+    "user_complexes",
+    "orders",
+    "complexes",
+    "products",
+    "product_types",
+]
+
+
+def _chunks(rows: list[dict], size: int = INSERT_CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def reset(bind: Engine) -> None:
+    """Empty everything the seeder writes; the admin account and its class are kept."""
+    with bind.begin() as conn:
+        conn.execute(text(f"TRUNCATE {', '.join(_RESET_TABLES)} CASCADE"))
+        conn.execute(delete(User).where(User.login.like(f"{BENCH_PREFIX}_%")))
+        conn.execute(delete(Class).where(~Class.id.in_(select(User.class_id).distinct())))
+    with bind.begin() as conn:
+        conn.execute(text("REFRESH MATERIALIZED VIEW weekly_choice_summary"))
+
+
+def seed(
+    bind: Engine,
+    classes: int,
+    students: int,
+    complexes: int,
+    weeks: int,
+    products_per_complex: int = 4,
+    seed: int = 1,
+) -> dict:
+    rng = random.Random(seed)
+    today = date.today()
+    with bind.begin() as conn:
+        if conn.execute(select(func.count()).select_from(Complex)).scalar_one():
+            raise SystemExit("database already has complexes; run with --reset on a disposable database")
+        role_id = conn.execute(select(UserRole.id).where(UserRole.name == "user")).scalar_one()
+        weekday_ids = conn.execute(select(Weekday.id).order_by(Weekday.id).limit(5)).scalars().all()
+
+        class_ids = conn.execute(
+            insert(Class).returning(Class.id),
+            [
+                {"number": 1 + i // 4, "letter": "АБВГ"[i % 4], "year": today.year, "is_active": True, "class_rate": 0}
+                for i in range(classes)
+            ],
+        ).scalars().all()
+
+        password_hash = hash_password(STUDENT_PASSWORD)
+        user_rows = [
+            {
+                "login": f"{BENCH_PREFIX}_{cls_id}_{n}",
+                "name": f"Имя{n}",
+                "lastname": f"Фамилия{rng.randrange(10_000):04d}",
+                "patronymic": "Отчество",
+                "age": 7 + cls_id % 11,
+                "class_id": cls_id,
+                "phone_number": "0",
+                "created_at": today,
+                "avatar_url": "",
+                "user_rate": 0,
+                "role_id": role_id,
+                "is_complex": True,
+                "password_hash": password_hash,
+            }
+            for cls_id in class_ids
+            for n in range(students)
+        ]
+        user_ids = []
+        for chunk in _chunks(user_rows):
+            user_ids += conn.execute(insert(User).returning(User.id), chunk).scalars().all()
+
+        type_id = conn.execute(insert(ProductType).returning(ProductType.id), [{"name": "bench"}]).scalar_one()
+        product_ids = conn.execute(
+            insert(Product).returning(Product.id),
+            [
+                {
+                    "name": f"Продукт {i}",
+                    "blc": 0,
+                    "mass": rng.randrange(50, 300),
+                    "rate": 0,
+                    "picture_url": "",
+                    "price": round(rng.uniform(10, 120), 2),
+                    "compound": "",
+                    "is_hidden": False,
+                    "is_complex": True,
+                    "product_type_id": type_id,
+                }
+                for i in range(max(complexes * 2, products_per_complex))
+            ],
+        ).scalars().all()
+
+        complex_ids = conn.execute(
+            insert(Complex).returning(Complex.id),
+            [{"name": f"Комплекс {i + 1}", "creation_date": today, "is_closed": False} for i in range(complexes)],
+        ).scalars().all()
+        conn.execute(insert(ComplexProduct), [
+            {"complex_id": cid, "product_id": pid}
+            for cid in complex_ids
+            for pid in rng.sample(product_ids, products_per_complex)
+        ])
+        offer = {wid: rng.sample(complex_ids, max(1, len(complex_ids) * 2 // 3)) for wid in weekday_ids}
+        conn.execute(insert(ComplexWeekday), [
+            {"complex_id": cid, "weekday_id": wid} for wid, cids in offer.items() for cid in cids
+        ])
+
+    last_week = next_monday(today)
+    week_starts = [last_week - timedelta(days=7 * i) for i in reversed(range(weeks))]
+    choices = 0
+    for week_start in week_starts:
+        ensure_choice_partition(bind, week_start)
+        # most students choose, some skip days to exercise the fallback
+        rows = [
+            {"week_start": week_start, "user_id": uid, "weekday_id": wid, "complex_id": rng.choice(cids)}
+            for uid in user_ids
+            for wid, cids in offer.items()
+            if rng.random() < 0.85
+        ]
+        with bind.begin() as conn:
+            for chunk in _chunks(rows):
+                conn.execute(insert(UserComplexChoice), chunk)
+        choices += len(rows)
+    with bind.begin() as conn:
+        conn.execute(text("REFRESH MATERIALIZED VIEW weekly_choice_summary"))
+
+    return {
+        "classes": len(class_ids),
+        "students": len(user_ids),
+        "complexes": len(complex_ids),
+        "products": len(product_ids),
+        "weeks": [w.isoformat() for w in week_starts],
+        "choices": choices,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--classes", type=int, default=30)
+    parser.add_argument("--students", type=int, default=25, help="students per class")
+    parser.add_argument("--complexes", type=int, default=8)
+    parser.add_argument("--weeks", type=int, default=4, help="weeks of choices, ending with next week")
+    parser.add_argument("--products-per-complex", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="empty previously seeded data first")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.reset:
+        reset(engine)
+    summary = seed(
+        engine,
+        classes=args.classes,
+        students=args.students,
+        complexes=args.complexes,
+        weeks=args.weeks,
+        products_per_complex=args.products_per_complex,
+        seed=args.seed,
+    )
+    print(f"seeded {summary} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()